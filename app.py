@@ -1,12 +1,18 @@
 # Веб-приложение Flask
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
-from datetime import datetime
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for
+from datetime import datetime, timezone
+import hashlib
+import json
 import os
+import time
+import zlib
+import backup
 import database
 import parser
+import scheduler
 import telegram_bot
 import config
-from export import export_to_excel
+import export as exporter
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
@@ -25,6 +31,7 @@ def format_number(value):
 db = database.Database()
 torgi_parser = parser.TorgiParser()
 telegram = telegram_bot.TelegramBot()
+export_cache = exporter.ExportCache()
 
 # Список регионов (можно расширить)
 REGIONS = [
@@ -77,125 +84,309 @@ LOT_TYPES = [
 @app.route('/')
 def index():
     """Главная страница с настройкой фильтров"""
-    saved_filters = db.get_filters() or {}
+    profile = request.args.get('profile', database.DEFAULT_FILTER_PROFILE)
+    saved_filters = db.get_filters(profile) or {}
     return render_template('index.html', 
                          regions=REGIONS,
                          statuses=STATUSES,
                          lot_types=LOT_TYPES,
-                         saved_filters=saved_filters)
+                         saved_filters=saved_filters,
+                         profile=profile,
+                         profiles=list(db.get_filter_profiles()))
 
 @app.route('/api/filters', methods=['POST'])
 def save_filters():
-    """Сохранить фильтры"""
+    """Сохранить фильтры профиля (?name=..., по умолчанию default)"""
     try:
         filters = request.json
-        db.save_filters(filters)
-        return jsonify({'success': True})
+        name = request.args.get('name') or database.DEFAULT_FILTER_PROFILE
+        db.save_filters(filters, name)
+        return jsonify({'success': True, 'name': name})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/filters', methods=['GET'])
 def get_filters():
-    """Получить сохраненные фильтры"""
-    filters = db.get_filters()
+    """Получить сохраненные фильтры профиля (?name=..., по умолчанию default)"""
+    name = request.args.get('name') or database.DEFAULT_FILTER_PROFILE
+    filters = db.get_filters(name)
     return jsonify(filters or {})
 
-@app.route('/lots')
-def lots():
-    """Страница со списком лотов"""
+@app.route('/api/filters', methods=['DELETE'])
+def delete_filters():
+    """Удалить профиль фильтров"""
+    name = request.args.get('name')
+    if not name:
+        return jsonify({'success': False, 'error': 'Не указано имя профиля'}), 400
+    return jsonify({'success': db.delete_filters(name)})
+
+@app.route('/api/filters/profiles')
+def get_filter_profiles():
+    """Все профили фильтров"""
+    return jsonify(db.get_filter_profiles())
+
+def lot_filters_from_request() -> dict:
+    """Фильтры списка лотов из параметров запроса"""
+    filters = {}
     region_filter = request.args.get('region', '')
     status_filter = request.args.get('status', '')
-    
-    filters = {}
+    search_query = request.args.get('q', '').strip()
     if region_filter:
         filters['region'] = region_filter
     if status_filter:
         filters['status'] = status_filter
+    if search_query:
+        filters['q'] = search_query
+    # ?archived=1 — вместе с завершёнными лотами, перенесёнными в архив
+    if request.args.get('archived'):
+        filters['archived'] = True
+    return filters
+
+# Столбцы, которые показывает страница /lots
+LOTS_PAGE_COLUMNS = ('title', 'region', 'initial_price', 'current_price', 'currency',
+                     'status', 'application_deadline', 'lot_url')
+
+@app.route('/lots')
+def lots():
+    """Страница со списком лотов (постранично, ?cursor=...)"""
+    filters = lot_filters_from_request()
+    try:
+        lots_list, next_cursor = db.get_lots_page(
+            filters,
+            cursor=request.args.get('cursor') or None,
+            columns=LOTS_PAGE_COLUMNS
+        )
+    except ValueError:
+        return redirect(url_for('lots', **filters))
     
-    lots_list = db.get_all_lots(filters)
-    return render_template('lots.html', lots=lots_list, regions=REGIONS, statuses=STATUSES)
+    return render_template('lots.html', lots=lots_list, regions=REGIONS, statuses=STATUSES,
+                         next_cursor=next_cursor,
+                         is_first_page=not request.args.get('cursor'),
+                         total_lots=db.count_lots(filters))
+
+# Форматы потоковой выдачи /api/lots: format -> Content-Type
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+def stream_rows(rows, fmt: str, compress: bool):
+    """Строки лотов -> куски тела ответа (JSON-массив или по объекту на строку), при compress — gzip"""
+    def encoded():
+        buffer = []
+        size = 0
+        first = True
+        if fmt == 'json':
+            buffer.append('[')
+        for row in rows:
+            item = json.dumps(row, ensure_ascii=False, default=str)
+            if fmt == 'ndjson':
+                item += '\n'
+            elif not first:
+                item = ',' + item
+            first = False
+            buffer.append(item)
+            size += len(item)
+            # Отдаём кусками по ~64 КБ, а не по строке: меньше накладных расходов на запись
+            if size >= 65536:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+        if fmt == 'json':
+            buffer.append(']')
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+
+    if not compress:
+        yield from encoded()
+        return
+    # wbits=31 — формат gzip; Z_SYNC_FLUSH отдаёт клиенту каждый кусок сразу
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in encoded():
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
 
 @app.route('/api/lots')
 def api_lots():
-    """API для получения лотов"""
-    region_filter = request.args.get('region', '')
-    status_filter = request.args.get('status', '')
+    """API для получения лотов.
     
-    filters = {}
-    if region_filter:
-        filters['region'] = region_filter
-    if status_filter:
-        filters['status'] = status_filter
+    Параметры: region, status, q (полнотекстовый поиск), limit (по умолчанию LOTS_PAGE_SIZE), cursor,
+    columns (через запятую), format (json — массив, ndjson — объект на строку). Курсор следующей
+    страницы — в заголовке X-Next-Cursor. Ответ отдаётся потоком из курсора базы (gzip, если клиент
+    его принимает). ETag зависит от версии данных и параметров запроса: пока лоты не менялись,
+    повторный запрос с If-None-Match получает 304 без чтения таблицы lots.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f"Неизвестный формат: {fmt}"}), 400
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
     
-    lots_list = db.get_all_lots(filters)
-    return jsonify(lots_list)
+    query = hashlib.sha1(request.query_string).hexdigest()[:16]
+    etag = f"{db.data_version()}-{query}{'-gz' if compress else ''}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    filters = lot_filters_from_request()
+    columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+    try:
+        rows, next_cursor = db.iter_lots_page(
+            filters,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', config.LOTS_PAGE_SIZE, type=int),
+            columns=columns or None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = Response(stream_rows(rows, fmt, compress), mimetype=STREAM_FORMATS[fmt])
+    response.set_etag(etag)
+    # Клиент может хранить ответ, но обязан сверять его с сервером при каждом запросе
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def parse_timestamp(value: str) -> float:
+    """Дата/время из параметра запроса (ISO 8601, без зоны — UTC) в секундах Unix"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+@app.route('/api/lots/<lot_number>/timeline')
+def lot_timeline(lot_number):
+    """Хронология изменений полей лота"""
+    if not db.get_lot(lot_number):
+        return jsonify({'error': 'Лот не найден'}), 404
+    return jsonify(db.get_lot_timeline(lot_number))
+
+@app.route('/api/changes')
+def api_changes():
+    """Изменения лотов за период.
+    
+    Параметры: days (по умолчанию 7) или since/until (ISO 8601), field
+    (через запятую, например current_price), region, direction (down/up, только для цен),
+    limit, cursor. Курсор следующей страницы — в заголовке X-Next-Cursor.
+    """
+    try:
+        if request.args.get('since'):
+            since = parse_timestamp(request.args['since'])
+        else:
+            since = time.time() - request.args.get('days', 7, type=float) * 86400
+        until = parse_timestamp(request.args['until']) if request.args.get('until') else None
+        fields = [f.strip() for f in request.args.get('field', '').split(',') if f.strip()]
+        changes, next_cursor = db.get_changes(
+            since,
+            until=until,
+            fields=fields or None,
+            region=request.args.get('region') or None,
+            direction=request.args.get('direction') or None,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', config.LOTS_PAGE_SIZE, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify(changes)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 @app.route('/export')
 def export():
-    """Экспорт лотов в Excel"""
-    try:
-        region_filter = request.args.get('region', '')
-        status_filter = request.args.get('status', '')
-        
-        filters = {}
-        if region_filter:
-            filters['region'] = region_filter
-        if status_filter:
-            filters['status'] = status_filter
-        
-        lots_list = db.get_all_lots(filters)
-        
-        filename = export_to_excel(lots_list)
-        return send_file(filename, as_attachment=True, download_name=f'auctions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    """Выгрузка лотов: ?format=xlsx (по умолчанию), csv или parquet, с фильтрами списка"""
+    fmt = request.args.get('format', 'xlsx')
+    if fmt not in exporter.EXPORT_FORMATS:
+        return jsonify({'error': f"Неизвестный формат выгрузки: {fmt}"}), 400
+    filters = lot_filters_from_request()
+    # Версия читается до выгрузки: если лоты изменятся во время записи,
+    # следующий запрос получит новую версию и соберёт файл заново
+    data_version = db.data_version()
+    path = export_cache.get(filters, fmt, data_version)
+    cache_status = 'HIT'
+    if path is None:
+        cache_status = 'MISS'
+        try:
+            path = export_cache.put(filters, fmt, data_version, db.iter_lots(filters))
+        except exporter.ExportFormatUnavailable as e:
+            return jsonify({'error': str(e)}), 501
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    response = send_file(path, as_attachment=True, download_name=exporter.export_filename(fmt),
+                         mimetype=exporter.EXPORT_FORMATS[fmt][2])
+    response.headers['X-Export-Cache'] = cache_status
+    return response
 
 @app.route('/api/check', methods=['POST'])
 def manual_check():
-    """Ручная проверка новых лотов"""
-    try:
-        filters = db.get_filters() or {}
-        lots = torgi_parser.get_all_lots(filters, max_pages=5)
-        
-        new_count = 0
-        updated_count = 0
-        
-        for lot in lots:
-            # Получаем детали лота
-            if lot.get('lot_url'):
-                try:
-                    details = torgi_parser.get_lot_details(lot['lot_url'])
-                    lot.update(details)
-                except Exception as e:
-                    print(f"Не удалось получить детали лота {lot.get('lot_number')}: {e}")
-            
-            existing_lot = db.get_lot(lot.get('lot_number', ''))
-            is_new = db.save_lot(lot)
-            
-            if is_new:
-                new_count += 1
-                telegram.notify_new_lot(lot)
-            elif existing_lot and existing_lot.get('status') != lot.get('status'):
-                updated_count += 1
-                telegram.notify_status_change(lot, existing_lot.get('status'))
-        
-        return jsonify({
-            'success': True,
-            'new_lots': new_count,
-            'updated_lots': updated_count,
-            'total_found': len(lots)
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    """Ручная проверка новых лотов в фоне: сразу возвращает id проверки.
+    
+    Если проверка (плановая или ручная) уже идёт, вторая не запускается —
+    возвращается id идущей (attached: true).
+    """
+    job, started = scheduler.checks.submit(db, torgi_parser, telegram, source='manual')
+    response = jsonify({'success': True, 'job_id': job.id, 'attached': not started, 'status': job.status})
+    response.status_code = 202
+    response.headers['Location'] = url_for('check_status', job_id=job.id)
+    return response
+
+@app.route('/api/check', methods=['GET'])
+def latest_check():
+    """Идущая или последняя проверка"""
+    job = scheduler.checks.latest()
+    if job is None:
+        return jsonify({'error': 'Проверок ещё не было'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/check/<job_id>')
+def check_status(job_id):
+    """Ход проверки: этап, загружено страниц, обработано лотов, оценка оставшегося времени; по окончании — сводка"""
+    job = scheduler.checks.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Проверка не найдена'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/stats')
+def api_stats():
+    """Сводная статистика лотов: итог и разрезы по региону, статусу, виду торгов"""
+    return jsonify(db.get_stats())
+
+@app.route('/api/backup', methods=['GET'])
+def backup_status():
+    """Сведения о последней резервной копии: время, длительность, размер файлов; running — снимается ли копия сейчас"""
+    report = backup.last_backup()
+    if report is None and not backup.is_running():
+        return jsonify({'error': 'Резервных копий ещё не было'}), 404
+    return jsonify({**(report or {}), 'running': backup.is_running()})
+
+@app.route('/api/backup', methods=['POST'])
+def run_backup():
+    """Снять резервную копию сейчас (в фоне); результат — в GET /api/backup.
+    
+    Если копия уже снимается, вторая не запускается (started: false).
+    """
+    started = backup.BackupManager().start()
+    response = jsonify({'started': started, 'running': True})
+    response.status_code = 202
+    response.headers['Location'] = url_for('backup_status')
+    return response
 
 @app.route('/status')
 def status():
     """Страница статуса приложения"""
-    total_lots = len(db.get_all_lots())
-    saved_filters = db.get_filters() or {}
+    stats = db.get_stats()
+    profiles = db.get_filter_profiles()
     return render_template('status.html', 
-                         total_lots=total_lots,
-                         filters=saved_filters,
+                         total_lots=stats['total']['lots'],
+                         archived_lots=stats['archived'],
+                         stats=stats,
+                         last_backup=backup.last_backup(),
+                         profiles=profiles,
                          check_interval=config.CHECK_INTERVAL_MINUTES)
 
 if __name__ == '__main__':
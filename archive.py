@@ -0,0 +1,228 @@
+# Модуль архива сырых ответов torgi.gov.ru и офлайн-переразбора
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+# Виды архивируемых ответов
+KIND_API = 'api'
+KIND_LISTING = 'listing'
+KIND_DETAIL = 'detail'
+
+class ResponseArchive:
+    """Архив сырых ответов с адресацией по содержимому.
+
+    Тело ответа сжимается gzip и хранится в objects/<xx>/<sha256>.gz —
+    одинаковые страницы хранятся один раз. В index.db записывается каждая
+    загрузка: вид ответа, URL, фильтры, номер страницы и хэш содержимого.
+    """
+
+    def __init__(self, root: str = config.ARCHIVE_DIR,
+                 retention_days: float = config.ARCHIVE_RETENTION_DAYS):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.retention_seconds = retention_days * 86400
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS fetches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                filters TEXT,
+                page INTEGER,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_fetches_fetched_at ON fetches(fetched_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_fetches_hash ON fetches(content_hash)')
+        self._conn.commit()
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.objects_dir, content_hash[:2], f"{content_hash}.gz")
+
+    def store(self, kind: str, url: str, content: bytes,
+              filters: Optional[Dict] = None, page: Optional[int] = None) -> str:
+        """Сохранить ответ в архив, вернуть хэш содержимого"""
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self._object_path(content_hash)
+        try:
+            # Объект уже есть: обновляем mtime, иначе очистка по сроку хранения может
+            # удалить старый объект до того, как новая запись о нём попадёт в индекс
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO fetches (kind, url, filters, page, content_hash, size, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (kind, url, json.dumps(filters, ensure_ascii=False, sort_keys=True) if filters is not None else None,
+                  page, content_hash, len(content), time.time()))
+            self._conn.commit()
+        return content_hash
+
+    def load(self, content_hash: str) -> bytes:
+        """Прочитать тело ответа по хэшу"""
+        with gzip.open(self._object_path(content_hash), 'rb') as f:
+            return f.read()
+
+    def entries(self, kind: Optional[str] = None, since: Optional[float] = None) -> List[Dict]:
+        """Записи о загрузках в хронологическом порядке"""
+        query = 'SELECT * FROM fetches WHERE 1=1'
+        params: list = []
+        if kind:
+            query += ' AND kind = ?'
+            params.append(kind)
+        if since:
+            query += ' AND fetched_at >= ?'
+            params.append(since)
+        query += ' ORDER BY fetched_at, id'
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def apply_retention(self) -> Dict:
+        """Удалить записи старше срока хранения и объекты, на которые больше никто не ссылается"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM fetches WHERE fetched_at < ?', (cutoff,))
+            deleted_entries = cursor.rowcount
+            self._conn.commit()
+            referenced = {row[0] for row in self._conn.execute('SELECT DISTINCT content_hash FROM fetches')}
+
+        deleted_objects = 0
+        freed_bytes = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                if not filename.endswith('.gz'):
+                    continue
+                if filename[:-3] in referenced:
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    size = os.path.getsize(path)
+                    # Объект мог появиться только что — запись о нём ещё не в индексе
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                deleted_objects += 1
+                freed_bytes += size
+
+        logger.info(
+            f"Архив: удалено записей {deleted_entries}, объектов {deleted_objects}, "
+            f"освобождено {freed_bytes} байт"
+        )
+        return {'entries': deleted_entries, 'objects': deleted_objects, 'bytes': freed_bytes}
+
+# Парсер процесса-обработчика при переразборе (создаётся один раз на процесс)
+_replay_parser = None
+
+def _init_replay_worker():
+    global _replay_parser
+    import parser
+    _replay_parser = parser.TorgiParser(offline=True)
+
+def _parse_archived(task: Tuple[str, str, str, str]) -> Tuple[str, str, object]:
+    """Разобрать один архивный ответ текущей версией парсера (выполняется в отдельном процессе).
+
+    Если объекта нет на диске (удалён очисткой), вместо результата возвращается None.
+    """
+    kind, content_hash, url, root = task
+    archive_path = os.path.join(root, 'objects', content_hash[:2], f"{content_hash}.gz")
+    try:
+        with gzip.open(archive_path, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return kind, url, None
+
+    if kind == KIND_DETAIL:
+        return kind, url, _replay_parser.extract_lot_details(content)
+    if kind == KIND_API:
+        return kind, url, _replay_parser.parse_api_payload(content) or []
+    return kind, url, _replay_parser.parse_listing_html(content) or []
+
+def replay(db, archive: ResponseArchive, workers: Optional[int] = None,
+           since: Optional[float] = None) -> Dict:
+    """Пересобрать таблицу lots из архива без обращения к сайту.
+
+    Страницы списка разбираются параллельно в отдельных процессах; более
+    поздние загрузки перекрывают более ранние. Детали лота берутся из
+    последней архивной страницы лота и дополняют данные из списка; если
+    страницы лота в архиве нет, поля деталей остаются такими, как в базе.
+    """
+    started = time.monotonic()
+
+    # Один и тот же ответ разбирается один раз — по последней загрузке с этим содержимым
+    latest: Dict[Tuple[str, str], Dict] = {}
+    for entry in archive.entries(since=since):
+        if entry['kind'] == KIND_DETAIL:
+            key = (KIND_DETAIL, entry['url'])
+        else:
+            key = (entry['kind'], entry['content_hash'])
+        latest[key] = entry
+    tasks = [
+        (entry['kind'], entry['content_hash'], entry['url'], archive.root)
+        for entry in sorted(latest.values(), key=lambda e: (e['fetched_at'], e['id']))
+    ]
+
+    lots: Dict[str, Dict] = {}
+    details: Dict[str, Dict] = {}
+    missing = 0
+    with ProcessPoolExecutor(max_workers=workers or config.REPLAY_WORKERS,
+                             initializer=_init_replay_worker) as executor:
+        # map сохраняет хронологический порядок результатов
+        for kind, url, result in executor.map(_parse_archived, tasks, chunksize=16):
+            if result is None:
+                missing += 1
+                continue
+            if kind == KIND_DETAIL:
+                details[url] = result
+                continue
+            for lot in result:
+                lot_number = lot.get('lot_number')
+                if lot_number:
+                    lots[lot_number] = lot
+
+    # Лоты без страницы деталей в архиве (вне окна since или страница не менялась
+    # и не архивировалась заново) сохраняют поля деталей из базы
+    details_missing = []
+    for lot_number, lot in lots.items():
+        lot_details = details.get(lot.get('lot_url'))
+        if lot_details is None:
+            details_missing.append(lot_number)
+        else:
+            lot.update(lot_details)
+    saved = db.save_lots(list(lots.values()), details_missing=details_missing)
+
+    summary = {
+        'responses': len(tasks),
+        'missing_objects': missing,
+        'lots': len(lots),
+        'details_missing': len(details_missing),
+        'new_lots': len(saved['new']),
+        'changed_lots': len(saved['changed']),
+        'unchanged_lots': len(saved['unchanged']),
+        'seconds': round(time.monotonic() - started, 2),
+    }
+    logger.info(f"Переразбор архива завершён: {summary}")
+    return summary
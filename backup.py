@@ -0,0 +1,254 @@
+# Модуль резервного копирования базы лотов без остановки приложения
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import config
+import database
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Сведения о последнем резервном копировании (в каталоге копий)
+LAST_BACKUP_FILE = 'last_backup.json'
+# Файл блокировки: копию снимает один процесс (приложение или cron)
+LOCK_FILE = '.backup.lock'
+
+# Копия снимается не больше чем одна за раз и внутри процесса
+_running = threading.Lock()
+
+class BackupBusy(RuntimeError):
+    """Резервная копия уже снимается (этим или другим процессом)"""
+
+class BackupManager:
+    """Резервные копии базы лотов и архива завершённых лотов.
+
+    Обе базы копируются из одного согласованного снимка: на время открытия
+    снимка запись в них придерживается (BEGIN IMMEDIATE на отдельном
+    соединении), поэтому лот, переносимый между базой и архивом, попадает
+    ровно в одну из копий. Дальше снимок держит читающая транзакция, и
+    запись в режиме WAL идёт как обычно. Копия снимается через SQLite
+    online backup API порциями по pages_per_step страниц с паузой между ними,
+    проверяется integrity_check и сжимается gzip; старые копии сверх keep
+    удаляются.
+    """
+
+    def __init__(self, db_path: str = config.DATABASE_PATH,
+                 backup_dir: str = config.BACKUP_DIR,
+                 keep: int = config.BACKUP_KEEP,
+                 compress: bool = config.BACKUP_COMPRESS,
+                 pages_per_step: int = config.BACKUP_PAGES_PER_STEP,
+                 step_sleep: float = config.BACKUP_STEP_SLEEP):
+        self.db_path = db_path
+        self.archive_path = database.archive_path_for(db_path)
+        self.sources = [db_path, self.archive_path]
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.compress = compress
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+
+    def _connect(self, with_archive: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None)
+        if with_archive:
+            conn.execute('ATTACH DATABASE ? AS history', (self.archive_path,))
+        return conn
+
+    def _open_snapshot(self) -> Tuple[sqlite3.Connection, List[Tuple[str, str]]]:
+        """Соединение с открытым снимком и список (схема, путь базы) для копирования"""
+        # Архив завершённых лотов появляется вместе с базой; его может не быть у старой установки
+        with_archive = os.path.exists(self.archive_path)
+        schemas = [('main', self.db_path)] + ([('history', self.archive_path)] if with_archive else [])
+
+        source = self._connect(with_archive)
+        writer_lock = self._connect(with_archive)
+        try:
+            # Пока держим блокировку записи обеих баз, открываем в них читающую транзакцию
+            writer_lock.execute('BEGIN IMMEDIATE')
+            source.execute('BEGIN')
+            for schema, _ in schemas:
+                source.execute(f'SELECT COUNT(*) FROM {schema}.sqlite_master').fetchone()
+        except Exception:
+            source.close()
+            raise
+        finally:
+            writer_lock.close()
+        return source, schemas
+
+    def _copy(self, source: sqlite3.Connection, schema: str, target_path: str) -> int:
+        """Скопировать схему schema снимка в target_path, вернуть число страниц"""
+        pages = 0
+
+        def progress(status, remaining, total):
+            nonlocal pages
+            pages = total
+
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, name=schema, pages=self.pages_per_step, progress=progress,
+                          sleep=self.step_sleep)
+            # Копия — один самодостаточный файл, без -wal рядом
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+        return pages
+
+    @staticmethod
+    def _check_integrity(path: str) -> str:
+        """Результат PRAGMA integrity_check для копии ('ok' — копия цела)"""
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute('PRAGMA integrity_check').fetchall()
+        finally:
+            conn.close()
+        return '; '.join(str(row[0]) for row in rows)
+
+    def _backup_file(self, source: sqlite3.Connection, schema: str, source_path: str, stamp: str) -> Dict:
+        """Копия одной базы: снятие, проверка, сжатие"""
+        base = os.path.splitext(os.path.basename(source_path))[0]
+        target_path = os.path.join(self.backup_dir, f"{base}_{stamp}.db")
+        final_path = f"{target_path}.gz" if self.compress else target_path
+        # Временные файлы с уникальными именами: чужой запуск их не перезапишет и не удалит
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{base}_{stamp}_", suffix='.db.tmp', dir=self.backup_dir)
+        os.close(fd)
+        gz_tmp_path = None
+        try:
+            pages = self._copy(source, schema, tmp_path)
+            integrity = self._check_integrity(tmp_path)
+            if integrity != 'ok':
+                raise RuntimeError(f"Копия {source_path} повреждена: {integrity}")
+            if self.compress:
+                fd, gz_tmp_path = tempfile.mkstemp(prefix=f".{base}_{stamp}_", suffix='.db.gz.tmp',
+                                                   dir=self.backup_dir)
+                with os.fdopen(fd, 'wb') as raw, open(tmp_path, 'rb') as src, \
+                        gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(gz_tmp_path, final_path)
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, final_path)
+        except Exception:
+            for path in (tmp_path, gz_tmp_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        return {
+            'source': source_path,
+            'file': final_path,
+            'bytes': os.path.getsize(final_path),
+            'source_bytes': os.path.getsize(source_path),
+            'pages': pages,
+            'integrity': integrity,
+        }
+
+    def rotate(self) -> List[str]:
+        """Удалить копии сверх keep (для каждой базы отдельно), вернуть удалённые файлы"""
+        removed = []
+        for source_path in self.sources:
+            base = os.path.splitext(os.path.basename(source_path))[0]
+            pattern = re.compile(rf'^{re.escape(base)}_\d{{8}}_\d{{6}}\.db(\.gz)?$')
+            # Имя содержит время снятия, поэтому сортировка по имени — по времени
+            backups = sorted(name for name in os.listdir(self.backup_dir) if pattern.match(name))
+            for name in backups[:-self.keep] if self.keep > 0 else []:
+                os.remove(os.path.join(self.backup_dir, name))
+                removed.append(name)
+        return removed
+
+    @contextmanager
+    def _process_lock(self):
+        """Блокировка каталога копий между процессами (приложение и cron)"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with open(os.path.join(self.backup_dir, LOCK_FILE), 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise BackupBusy("Резервная копия уже снимается другим процессом") from None
+            yield
+
+    def run(self) -> Dict:
+        """Снять копии всех баз, удалить старые и записать сведения в last_backup.json.
+
+        Если копия уже снимается, выбрасывает BackupBusy.
+        """
+        if not _running.acquire(blocking=False):
+            raise BackupBusy("Резервная копия уже снимается")
+        try:
+            with self._process_lock():
+                return self._run()
+        finally:
+            _running.release()
+
+    def start(self) -> bool:
+        """Снять копию в фоновом потоке; False — копия уже снимается"""
+        if not _running.acquire(blocking=False):
+            return False
+
+        def run_locked():
+            try:
+                with self._process_lock():
+                    self._run()
+            except BackupBusy as e:
+                logger.warning(str(e))
+            finally:
+                _running.release()
+
+        threading.Thread(target=run_locked, name='backup', daemon=True).start()
+        return True
+
+    def _run(self) -> Dict:
+        started = time.monotonic()
+        started_at = datetime.now()
+        report = {'started_at': started_at.isoformat(timespec='seconds'), 'files': []}
+        try:
+            stamp = started_at.strftime('%Y%m%d_%H%M%S')
+            source, schemas = self._open_snapshot()
+            try:
+                for schema, source_path in schemas:
+                    report['files'].append(self._backup_file(source, schema, source_path, stamp))
+            finally:
+                source.close()
+            report['removed'] = self.rotate()
+            report['success'] = True
+        except Exception as e:
+            report['success'] = False
+            report['error'] = str(e)
+            logger.error(f"Ошибка резервного копирования: {e}")
+        report['duration_seconds'] = round(time.monotonic() - started, 2)
+        report['total_bytes'] = sum(item['bytes'] for item in report['files'])
+
+        with open(os.path.join(self.backup_dir, LAST_BACKUP_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        if report['success']:
+            logger.info(
+                f"Резервная копия готова за {report['duration_seconds']} с, "
+                f"{report['total_bytes']} байт, удалено старых копий: {len(report['removed'])}"
+            )
+        return report
+
+def is_running() -> bool:
+    """Снимается ли копия в этом процессе"""
+    return _running.locked()
+
+def last_backup(backup_dir: str = config.BACKUP_DIR) -> Optional[Dict]:
+    """Сведения о последнем резервном копировании (None, если копий ещё не было)"""
+    try:
+        with open(os.path.join(backup_dir, LAST_BACKUP_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,106 @@
+# Нагрузочная проверка базы: одновременные запись и чтение из нескольких потоков
+#
+# Запуск из корня репозитория:
+#   python benchmarks/db_stress.py                       # 4 писателя, 8 читателей, 10 секунд
+#   python benchmarks/db_stress.py --writers 8 --readers 16 --seconds 30
+#
+# Писатели сохраняют пачки лотов через Database.save_lots, читатели выполняют
+# get_all_lots и get_lot, как веб-интерфейс. Скрипт завершается с кодом 1, если
+# хотя бы одна операция упала (например, "database is locked").
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import database  # noqa: E402
+
+STATUSES = ('Прием заявок', 'Торги завершены', 'Отменен')
+
+def make_lot(number: int) -> dict:
+    return {
+        'lot_number': f"{number:08d}",
+        'title': f"Земельный участок {number}",
+        'lot_type': 'Аренда',
+        'initial_price': float(number),
+        'current_price': float(number),
+        'currency': 'RUB',
+        'region': random.choice(('Москва', 'Новосибирская область', 'Томская область')),
+        'status': random.choice(STATUSES),
+        'lot_url': f"https://torgi.gov.ru/new/public/lots/lot/{number}",
+    }
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description='Нагрузочная проверка SQLite базы лотов')
+    arg_parser.add_argument('--writers', type=int, default=4, help='Число потоков записи')
+    arg_parser.add_argument('--readers', type=int, default=8, help='Число потоков чтения')
+    arg_parser.add_argument('--seconds', type=float, default=10.0, help='Длительность прогона')
+    arg_parser.add_argument('--batch', type=int, default=50, help='Лотов в одной пачке записи')
+    arg_parser.add_argument('--lots', type=int, default=5000, help='Размер множества номеров лотов')
+    args = arg_parser.parse_args()
+
+    counts = Counter()
+    errors = Counter()
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = database.Database(os.path.join(workdir, 'stress.db'))
+
+        def writer():
+            while not stop.is_set():
+                lots = [make_lot(random.randrange(args.lots)) for _ in range(args.batch)]
+                try:
+                    db.save_lots(lots)
+                except Exception as e:
+                    with lock:
+                        errors[f"запись: {e}"] += 1
+                    continue
+                with lock:
+                    counts['write'] += 1
+            db.close()
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    if random.random() < 0.2:
+                        db.get_all_lots({'region': 'Томская'})
+                    else:
+                        db.get_lot(f"{random.randrange(args.lots):08d}")
+                except Exception as e:
+                    with lock:
+                        errors[f"чтение: {e}"] += 1
+                    continue
+                with lock:
+                    counts['read'] += 1
+            db.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+        threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    print(f"Записей пачек: {counts['write']} ({counts['write'] / elapsed:.1f}/с), "
+          f"чтений: {counts['read']} ({counts['read'] / elapsed:.1f}/с)")
+    if errors:
+        print("Ошибки:")
+        for message, count in errors.most_common():
+            print(f"  {count} × {message}")
+        return 1
+    print("Ошибок нет")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
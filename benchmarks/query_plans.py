@@ -0,0 +1,152 @@
+# Проверка планов частых запросов к базе лотов (EXPLAIN QUERY PLAN)
+#
+# Запуск из корня репозитория:
+#   python benchmarks/query_plans.py                     # на временной базе с синтетическими лотами
+#   python benchmarks/query_plans.py --db auctions.db    # на рабочей базе (только чтение планов)
+#
+# Скрипт завершается с кодом 1, если какой-либо из частых запросов
+# (hot_queries) читает большую таблицу целиком.
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Dict, Iterable, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import config  # noqa: E402
+import database  # noqa: E402
+
+REGIONS = ('Москва', 'Новосибирская область', 'Томская область', 'Омская область')
+STATUSES = ('Прием заявок', 'Торги завершены', 'Отменен')
+
+def fill(db: database.Database, count: int):
+    """Наполнить базу синтетическими лотами и их изменениями, чтобы у планировщика была статистика"""
+    lots = [
+        {
+            'lot_number': f"{i:08d}",
+            'title': f"Земельный участок {i}",
+            'lot_type': 'Аренда',
+            'region': REGIONS[i % len(REGIONS)],
+            'status': STATUSES[i % len(STATUSES)],
+            'organizer': f"Организатор {i % 50}",
+            'address': f"ул. Ленина, {i}",
+            'current_price': float(1000 + i),
+        }
+        for i in range(count)
+    ]
+    db.save_lots(lots)
+    # Несколько проверок: цены снижаются, часть статусов меняется
+    for step in range(1, 4):
+        for i, lot in enumerate(lots):
+            if i % 3 == 0:
+                lot['current_price'] -= 10
+            if i % 7 == step:
+                lot['status'] = STATUSES[(i + step) % len(STATUSES)]
+        db.save_lots(lots)
+    db.get_connection().execute('ANALYZE')
+
+def explain(db: database.Database, query: str, params: Iterable = ()) -> List[str]:
+    """План выполнения запроса (строки EXPLAIN QUERY PLAN)"""
+    conn = db.get_connection()
+    return [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', list(params))]
+
+def hot_queries(db: database.Database) -> Dict[str, Tuple[str, List]]:
+    """Частые запросы веб-интерфейса и планировщика: имя -> (SQL, параметры).
+
+    SQL строится теми же методами, что и в Database, поэтому проверяется ровно то,
+    что выполняет приложение.
+    """
+    cursor = database.encode_cursor('2024-01-01 00:00:00', 1)
+    conn = db.get_connection()
+    # Значения фильтров берём из справочников, иначе условие выродится в AND 0
+    region = conn.execute('SELECT name FROM regions ORDER BY id LIMIT 1').fetchone()
+    status = conn.execute('SELECT name FROM statuses ORDER BY id LIMIT 1').fetchone()
+    region = region[0] if region else 'Москва'
+    status = status[0] if status else 'Прием заявок'
+    queries = {
+        'get_lot': (
+            f"SELECT {', '.join(database._LOT_SELECT_COLUMNS)} FROM lots_view WHERE lot_number = ?", ['1']
+        ),
+    }
+    shapes = {
+        'page': {},
+        'page[region]': {'region': region},
+        'page[status]': {'status': status},
+        'page[region,status]': {'region': region, 'status': status},
+    }
+    if db.fts_enabled:
+        shapes['page[q]'] = {'q': 'земельный участок'}
+    for name, filters in shapes.items():
+        queries[name] = db._lots_page_query(filters, None, config.LOTS_PAGE_SIZE, None)[:2]
+        queries[f'{name}+cursor'] = db._lots_page_query(filters, cursor, config.LOTS_PAGE_SIZE, None)[:2]
+    # Потоковая страница /api/lots: между курсором и ключом следующей страницы
+    queries['page+stream'] = db._lots_page_query(
+        {}, cursor, config.LOTS_PAGE_SIZE, None, stream=True, last_key=('2023-01-01 00:00:00', 1)
+    )[:2]
+
+    week_ago = time.time() - 7 * 86400
+    queries['status_history'] = ('SELECT * FROM status_history WHERE lot_number = ? ORDER BY changed_at DESC', ['1'])
+    queries['changes'] = db._changes_query(week_ago)
+    queries['changes[field]'] = db._changes_query(week_ago, fields=['current_price'], direction='down')
+    queries['changes[field,region]'] = db._changes_query(
+        week_ago, fields=['current_price'], region=region, direction='down'
+    )
+    return queries
+
+def check_query_plans(db: database.Database) -> List[str]:
+    """Проверить, что частые запросы не читают большие таблицы целиком.
+
+    Возвращает список проблем (пустой — всё в порядке). Полным чтением
+    считается SCAN больших таблиц (lots, lot_changes, status_history) без
+    индекса или по индексу, который не задаёт нужный порядок (тогда в плане
+    есть временное B-дерево для ORDER BY).
+    """
+    problems = []
+    large_table = r'SCAN (lots|lot_changes|status_history)\b'
+    for name, (query, params) in hot_queries(db).items():
+        plan = explain(db, query, params)
+        full_scan = any(re.match(large_table + r'(?! USING (COVERING )?INDEX)', line) for line in plan)
+        unordered_scan = (
+            any(re.match(large_table, line) for line in plan)
+            and any('TEMP B-TREE FOR ORDER BY' in line for line in plan)
+        )
+        if full_scan or unordered_scan:
+            problems.append(f"{name}: {'; '.join(plan)}")
+    return problems
+
+def report(db: database.Database) -> int:
+    for name, (query, params) in hot_queries(db).items():
+        print(name)
+        for line in explain(db, query, params):
+            print(f"    {line}")
+    problems = check_query_plans(db)
+    if problems:
+        print("Запросы с полным чтением таблицы lots:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("Все частые запросы используют индексы")
+    return 0
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description='Проверка планов частых запросов к базе лотов')
+    arg_parser.add_argument('--db', help='Путь к существующей базе (по умолчанию — временная)')
+    arg_parser.add_argument('--lots', type=int, default=20000, help='Сколько синтетических лотов создать')
+    args = arg_parser.parse_args()
+
+    if args.db:
+        return report(database.Database(args.db))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = database.Database(os.path.join(workdir, 'plans.db'))
+        fill(db, args.lots)
+        code = report(db)
+        db.close()
+    return code
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Проверка размыкателя ThrottledSession без обращения к сайту
+#
+# Запуск из корня репозитория:
+#   python benchmarks/ratelimit_check.py
+#
+# Запросы уходят в подставной транспорт, который отвечает заданными кодами или
+# выбрасывает исключения requests. Для каждого сценария проверяется, в каком
+# состоянии остаётся размыкатель. Скрипт завершается с кодом 1, если хотя бы
+# один сценарий не прошёл (например, пробный запрос не разрешился и
+# размыкатель остался открытым навсегда).
+import logging
+import os
+import sys
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from ratelimit import AdaptiveRateLimiter, CircuitBreaker, CircuitOpenError, ThrottledSession  # noqa: E402
+
+RESET_SECONDS = 0.05
+URL = 'https://torgi.invalid/lots'
+
+class ScriptedAdapter(BaseAdapter):
+    """Транспорт, который по очереди отдаёт заданные ответы: код или исключение"""
+
+    def __init__(self, outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+
+    def send(self, request, **kwargs):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response.url = request.url
+        response.request = request
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+def make_session(outcomes) -> ThrottledSession:
+    session = ThrottledSession(
+        limiter=AdaptiveRateLimiter(rate=1000, max_rate=1000, burst=1000),
+        breaker=CircuitBreaker(failure_threshold=2, reset_seconds=RESET_SECONDS),
+        max_retries=0,
+    )
+    session.mount('https://', ScriptedAdapter(outcomes))
+    return session
+
+def request(session: ThrottledSession):
+    """Один запрос; исключение возвращается вместо ответа"""
+    try:
+        return session.get(URL)
+    except Exception as e:
+        return e
+
+def open_breaker(session: ThrottledSession):
+    """Довести размыкатель до открытого состояния и дождаться пробного запроса"""
+    request(session)
+    request(session)
+    assert session.breaker.is_open, 'размыкатель не открылся после серии ошибок'
+    time.sleep(RESET_SECONDS * 1.5)
+
+def check_trial(trial_outcome, expect_open: bool):
+    """Пробный запрос с исходом trial_outcome, затем ещё один запрос через reset_seconds"""
+    session = make_session([503, 503, trial_outcome, 200, 200])
+    open_breaker(session)
+    request(session)
+    assert session.breaker.is_open == expect_open, (
+        f"после пробного запроса размыкатель {'открыт' if session.breaker.is_open else 'закрыт'}"
+    )
+    # Пробный запрос разрешён: после паузы размыкатель снова пропускает запросы
+    time.sleep(RESET_SECONDS * 1.5)
+    result = request(session)
+    assert not isinstance(result, CircuitOpenError), 'размыкатель остался открытым навсегда'
+    assert not session.breaker.is_open, 'успешный запрос не закрыл размыкатель'
+
+CHECKS = {
+    'успешный пробный запрос замыкает размыкатель': lambda: check_trial(200, expect_open=False),
+    '429 в пробном запросе замыкает размыкатель': lambda: check_trial(429, expect_open=False),
+    '503 в пробном запросе снова открывает размыкатель': lambda: check_trial(503, expect_open=True),
+    'обрыв соединения в пробном запросе': lambda: check_trial(
+        requests.exceptions.ConnectionError('обрыв'), expect_open=True),
+    'оборванное тело ответа в пробном запросе': lambda: check_trial(
+        requests.exceptions.ChunkedEncodingError('обрыв тела'), expect_open=True),
+    'цикл редиректов в пробном запросе': lambda: check_trial(
+        requests.exceptions.TooManyRedirects('редиректы'), expect_open=True),
+    'неожиданное исключение в пробном запросе': lambda: check_trial(
+        RuntimeError('ошибка транспорта'), expect_open=True),
+}
+
+def main() -> int:
+    # Сообщения размыкателя об открытии ожидаемы и только засоряют вывод
+    logging.getLogger('ratelimit').setLevel(logging.ERROR)
+    failed = 0
+    for name, check in CHECKS.items():
+        try:
+            check()
+        except AssertionError as e:
+            failed += 1
+            print(f"ОШИБКА  {name}: {e}")
+        else:
+            print(f"ok      {name}")
+    if failed:
+        print(f"Не прошло проверок: {failed}")
+        return 1
+    print("Размыкатель работает корректно")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Запись свежих страниц torgi.gov.ru в benchmarks/fixtures
+#
+# Запуск из корня репозитория (нужен доступ к сайту):
+#   python benchmarks/record.py --lot-url https://torgi.gov.ru/new/public/lots/lot/<id>
+#
+# Перезаписывает api_search_page.json, listing_table.html (как отдаёт сервер)
+# и lot_detail.html. listing_cards.html и spa_rendered.html сохраняются вручную:
+# страницу, отрисованную браузером, удобнее снять через Selenium (driver.page_source).
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import requests  # noqa: E402
+import config  # noqa: E402
+
+API_URL = "https://torgi.gov.ru/new/api/public/lots/search"
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+def save(name: str, content: bytes):
+    path = os.path.join(FIXTURES_DIR, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    print(f"{name}: {len(content)} байт")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Записать страницы torgi.gov.ru для бенчмарков')
+    arg_parser.add_argument('--lot-url', help='URL страницы лота для lot_detail.html')
+    arg_parser.add_argument('--size', type=int, default=100, help='Размер страницы API')
+    args = arg_parser.parse_args()
+
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+
+    response = session.get(API_URL, params={'page': 1, 'size': args.size}, timeout=30)
+    response.raise_for_status()
+    save('api_search_page.json', response.content)
+
+    response = session.get(config.TORGI_BASE_URL, timeout=30)
+    response.raise_for_status()
+    save('listing_table.html', response.content)
+
+    if args.lot_url:
+        response = session.get(args.lot_url, timeout=30)
+        response.raise_for_status()
+        save('lot_detail.html', response.content)
+
+if __name__ == '__main__':
+    main()
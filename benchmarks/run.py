@@ -0,0 +1,201 @@
+# Бенчмарк парсера на записанных страницах torgi.gov.ru
+#
+# Запуск из корня репозитория:
+#   python benchmarks/run.py                          # отчёт в bench_report.json
+#   python benchmarks/run.py --save-baseline          # сохранить текущие результаты как эталон
+#   python benchmarks/run.py --baseline benchmarks/baseline.json --threshold 0.2
+#
+# При заданном эталоне скрипт завершается с кодом 1, если пропускная способность
+# какого-либо бенчмарка упала больше чем на threshold (доля) относительно эталона.
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import parser  # noqa: E402
+
+API_URL = "https://torgi.gov.ru/new/api/public/lots/search"
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+class StubResponse:
+    """Минимальная замена requests.Response для заглушки сессии"""
+
+    def __init__(self, status_code: int, content: bytes = b'', headers: Dict = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+class StubSession:
+    """Сессия, которая отдаёт записанные страницы вместо обращения к сайту"""
+
+    def __init__(self, api: bytes = None, listing: bytes = None):
+        self.api = api
+        self.listing = listing
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        if url.startswith(API_URL):
+            return StubResponse(200, self.api) if self.api is not None else StubResponse(404)
+        return StubResponse(200, self.listing) if self.listing is not None else StubResponse(404)
+
+def measure(func: Callable[[], int], min_seconds: float) -> Dict:
+    """Прогнать func, пока не наберётся min_seconds; func возвращает число обработанных элементов"""
+    func()  # прогрев
+
+    items = 0
+    iterations = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or iterations < 3:
+        items += func()
+        iterations += 1
+        elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'items': items,
+        'seconds': round(elapsed, 4),
+        'items_per_second': round(items / elapsed, 1),
+        'peak_memory_bytes': peak,
+    }
+
+def build_benchmarks(torgi_parser: parser.TorgiParser) -> Dict[str, Callable[[], int]]:
+    api_page = load_fixture('api_search_page.json')
+    table_html = load_fixture('listing_table.html')
+    cards_html = load_fixture('listing_cards.html')
+    spa_html = load_fixture('spa_rendered.html')
+    detail_html = load_fixture('lot_detail.html')
+
+    api_items = json.loads(api_page)['content']
+    table_rows = list(next(parser._parse_html(table_html).iter('table')).iter('tr'))[1:]
+    cards_root = parser._parse_html(cards_html)
+    cards = [el for el in cards_root.iter(*parser._CARD_TAGS) if parser._CARD_CLASS_RE.search(el.get('class', ''))]
+
+    def parse_api() -> int:
+        return sum(1 for item in api_items if torgi_parser.parse_lot_from_api(item))
+
+    def parse_rows() -> int:
+        return sum(1 for row in table_rows if torgi_parser.parse_lot_from_row(row))
+
+    def parse_cards() -> int:
+        return sum(1 for card in cards if torgi_parser.parse_lot_from_card(card))
+
+    def extract_details() -> int:
+        torgi_parser.extract_lot_details(detail_html)
+        return 1
+
+    def page_via(session: StubSession, filters: Dict) -> Callable[[], int]:
+        def run() -> int:
+            torgi_parser.session = session
+            return len(torgi_parser.get_lots_from_page(filters, page=1))
+        return run
+
+    return {
+        'parse_lot_from_api': parse_api,
+        'parse_lot_from_row': parse_rows,
+        'parse_lot_from_card': parse_cards,
+        'extract_lot_details': extract_details,
+        'get_lots_from_page[api]': page_via(StubSession(api=api_page), {'region': 'api'}),
+        'get_lots_from_page[table]': page_via(StubSession(listing=table_html), {'region': 'table'}),
+        'get_lots_from_page[cards]': page_via(StubSession(listing=cards_html), {'region': 'cards'}),
+        'get_lots_from_page[spa_rendered]': page_via(StubSession(listing=spa_html), {'region': 'spa'}),
+    }
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Список бенчмарков, чья пропускная способность упала сильнее порога"""
+    regressions = []
+    for name, base in baseline.get('benchmarks', {}).items():
+        current = results['benchmarks'].get(name)
+        if not current:
+            continue
+        limit = base['items_per_second'] * (1 - threshold)
+        if current['items_per_second'] < limit:
+            regressions.append(
+                f"{name}: {current['items_per_second']} эл/с < {limit:.1f} "
+                f"(эталон {base['items_per_second']}, порог {threshold:.0%})"
+            )
+    return regressions
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description='Бенчмарк парсера torgi.gov.ru')
+    arg_parser.add_argument('--output', default='bench_report.json', help='Куда записать JSON отчёт')
+    arg_parser.add_argument('--baseline', help='JSON отчёт-эталон для проверки регрессий')
+    arg_parser.add_argument('--threshold', type=float, default=0.2, help='Допустимое падение пропускной способности (доля)')
+    arg_parser.add_argument('--save-baseline', action='store_true', help='Записать результаты в benchmarks/baseline.json')
+    arg_parser.add_argument('--min-seconds', type=float, default=1.0, help='Минимальное время прогона одного бенчмарка')
+    arg_parser.add_argument('--only', help='Запустить только бенчмарки, в имени которых есть эта подстрока')
+    args = arg_parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    # Парсер создаёт файлы состояния (кэш, память стратегий) в текущей директории
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            torgi_parser = parser.TorgiParser()
+            # Архивирование ответов — это запись на диск, а не разбор
+            torgi_parser.archive = None
+            results = {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'benchmarks': {},
+            }
+            for name, func in build_benchmarks(torgi_parser).items():
+                if args.only and args.only not in name:
+                    continue
+                result = measure(func, args.min_seconds)
+                results['benchmarks'][name] = result
+                print(f"{name:36} {result['items_per_second']:>12} эл/с   пик памяти {result['peak_memory_bytes'] / 1024:.0f} КБ")
+            torgi_parser.close()
+        finally:
+            os.chdir(cwd)
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Отчёт: {output}")
+
+    if args.save_baseline:
+        with open(os.path.join(BENCH_DIR, 'baseline.json'), 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Регрессия производительности:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("Регрессий нет")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# Модуль пула headless-браузеров для Selenium-фоллбэка
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional, List
+import config
+
+def _process_tree_rss(root_pid: int) -> int:
+    """Суммарный RSS (в байтах) процесса и всех его потомков (Linux /proc)"""
+    children = {}
+    rss = {}
+    try:
+        pids = [int(p) for p in os.listdir('/proc') if p.isdigit()]
+    except OSError:
+        return 0
+
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                stat = f.read()
+            # Имя процесса в скобках может содержать пробелы
+            fields = stat[stat.rindex(')') + 2:].split()
+            ppid = int(fields[1])
+            rss[pid] = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+            children.setdefault(ppid, []).append(pid)
+        except (OSError, ValueError, IndexError):
+            continue
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+class PooledBrowser:
+    """Экземпляр Chrome в пуле со счётчиком обслуженных страниц"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+
+    def memory_usage(self) -> int:
+        """RSS chromedriver и всех процессов Chrome этого экземпляра"""
+        try:
+            pid = self.driver.service.process.pid
+        except AttributeError:
+            return 0
+        return _process_tree_rss(pid)
+
+    def is_healthy(self) -> bool:
+        """Проверить, что браузер отвечает"""
+        try:
+            self.driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+class BrowserPool:
+    """Пул долгоживущих headless Chrome.
+
+    Браузер возвращается в пул после использования и переиспользуется
+    следующими страницами. Экземпляр пересоздаётся, если он не проходит
+    проверку здоровья, обслужил max_pages страниц или превысил лимит памяти.
+    """
+
+    def __init__(self, size: int = config.BROWSER_POOL_SIZE,
+                 max_pages: int = config.BROWSER_RECYCLE_AFTER_PAGES,
+                 max_memory_mb: int = config.BROWSER_MAX_MEMORY_MB):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self._idle: "queue.LifoQueue[PooledBrowser]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._all: List[PooledBrowser] = []
+        self._lock = threading.Lock()
+
+    def _create(self) -> PooledBrowser:
+        try:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+        except Exception as e:
+            raise RuntimeError(
+                "Selenium не установлен. Установите: pip install -r requirements.txt и пакеты chromium/chromedriver"
+            ) from e
+
+        opts = Options()
+        opts.add_argument('--headless=new')
+        opts.add_argument('--no-sandbox')
+        opts.add_argument('--disable-dev-shm-usage')
+        opts.add_argument('--disable-gpu')
+        opts.add_argument('--window-size=1920,1080')
+
+        browser = PooledBrowser(webdriver.Chrome(options=opts))
+        with self._lock:
+            self._all.append(browser)
+        return browser
+
+    def _discard(self, browser: PooledBrowser):
+        browser.quit()
+        with self._lock:
+            if browser in self._all:
+                self._all.remove(browser)
+
+    def _needs_recycle(self, browser: PooledBrowser) -> Optional[str]:
+        """Причина пересоздания браузера или None, если он годен"""
+        if browser.pages_served >= self.max_pages:
+            return f"обслужено {browser.pages_served} страниц"
+        if self.max_memory_bytes:
+            usage = browser.memory_usage()
+            if usage > self.max_memory_bytes:
+                return f"память {usage // (1024 * 1024)} МБ"
+        if not browser.is_healthy():
+            return "не отвечает"
+        return None
+
+    @contextmanager
+    def browser(self):
+        """Взять браузер из пула на время загрузки одной страницы"""
+        self._slots.acquire()
+        try:
+            browser = None
+            while browser is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    browser = self._create()
+                    break
+                reason = self._needs_recycle(candidate)
+                if reason:
+                    print(f"Пересоздание браузера: {reason}")
+                    self._discard(candidate)
+                else:
+                    browser = candidate
+
+            try:
+                yield browser.driver
+            except Exception:
+                # Ошибка страницы (например, таймаут ожидания) не повод терять
+                # рабочий браузер — возвращаем его, если он отвечает
+                if browser.is_healthy():
+                    browser.pages_served += 1
+                    self._idle.put(browser)
+                else:
+                    self._discard(browser)
+                raise
+            else:
+                browser.pages_served += 1
+                self._idle.put(browser)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Закрыть все браузеры пула"""
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            browsers, self._all = self._all, []
+        for browser in browsers:
+            browser.quit()
@@ -13,9 +13,102 @@ WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")  # Можно переопредел
 
 # Настройки базы данных
 DATABASE_PATH = "auctions.db"
+# Режим журнала SQLite: WAL позволяет читать во время записи
+SQLITE_JOURNAL_MODE = "WAL"
+# Уровень синхронизации с диском (NORMAL безопасен в режиме WAL)
+SQLITE_SYNCHRONOUS = "NORMAL"
+# Сколько ждать освобождения блокировки другой записью (мс)
+SQLITE_BUSY_TIMEOUT_MS = 10000
+# Размер отображения файла базы в память (байт, 0 — выключить)
+SQLITE_MMAP_SIZE = 128 * 1024 * 1024
+# Размер кэша подготовленных запросов на соединение
+SQLITE_CACHED_STATEMENTS = 256
+
+# Архив завершённых лотов: отдельный файл рядом с базой (auctions.db -> auctions_archive.db)
+LOTS_ARCHIVE_STATUSES = ("Закрыт", "Отменен", "Аукцион проведен")
+LOTS_ARCHIVE_AFTER_DAYS = 30  # Переносить лоты, не менявшиеся дольше этого
+LOTS_ARCHIVE_BATCH = 1000  # Лотов за одну транзакцию переноса
+LOTS_VACUUM_STEP_PAGES = 500  # Страниц за один шаг incremental_vacuum (между шагами блокировка снимается)
+
+# Размер страницы списка лотов (веб-интерфейс и /api/lots)
+LOTS_PAGE_SIZE = 100
+# Максимальный размер страницы, который можно запросить через ?limit=
+LOTS_MAX_PAGE_SIZE = 1000
 
 # Настройки проверки
 CHECK_INTERVAL_MINUTES = 30
+CHECK_JOBS_KEEP = 20  # Сколько последних проверок хранить для опроса хода по id
+
+# Обход страниц реестра
+# "incremental" — останавливаться, как только страница состоит только из уже известных лотов
+# "full" — всегда обходить CRAWL_BACKFILL_LOTS лотов
+CRAWL_MODE = "incremental"
+# Пределы считаются в лотах: размер страницы API подбирается на ходу (см. API_PAGE_SIZES)
+CRAWL_MAX_LOTS = 100  # Максимум лотов при инкрементальном обходе
+CRAWL_BACKFILL_LOTS = 400  # Глубина полного обхода (первый запуск для набора фильтров)
+CRAWL_MAX_PAGES = 50  # Страховочный предел страниц, если сайт отдаёт их по несколько лотов
+
+# Размеры страницы API поиска лотов, пробуются по убыванию до первого принятого
+API_PAGE_SIZES = (100, 50, 20)
+# Сколько страниц API загружать одновременно, когда известно их общее число
+PAGE_FETCH_WORKERS = 4
+
+# Сколько профилей фильтров обходить одновременно
+PROFILE_CRAWL_WORKERS = 3
+
+# Параллельная загрузка деталей лотов
+DETAIL_FETCH_WORKERS = 8  # Общее число потоков загрузки
+DETAIL_FETCH_PER_HOST = 4  # Не больше стольких одновременных запросов к одному хосту
+
+# Кэш HTTP-ответов для страниц лотов
+HTTP_CACHE_PATH = "http_cache.db"
+HTTP_CACHE_TTL_HOURS = 72  # Записи старше этого удаляются
+HTTP_CACHE_MAX_BYTES = 50 * 1024 * 1024  # Лимит размера, сверх него удаляются давно неиспользуемые
+
+# Память стратегий получения списка лотов (API, HTML, Selenium)
+STRATEGY_STATE_PATH = "fetch_strategies.json"
+STRATEGY_REPROBE_HOURS = 24  # Как часто заново пробовать более быстрые стратегии
+
+# Архив сырых ответов сайта (для переразбора без повторного обхода)
+ARCHIVE_ENABLED = True
+ARCHIVE_DIR = "archive"
+ARCHIVE_RETENTION_DAYS = 90
+REPLAY_WORKERS = os.cpu_count() or 2  # Процессов при переразборе архива
+
+# Пул headless-браузеров (Selenium-фоллбэк для SPA)
+BROWSER_POOL_SIZE = 1
+BROWSER_RECYCLE_AFTER_PAGES = 50  # Перезапуск браузера после стольких страниц
+BROWSER_MAX_MEMORY_MB = 1024  # Перезапуск, если Chrome занимает больше (0 — без лимита)
+
+# Ограничение частоты запросов к сайту (подстраивается под задержки и ошибки)
+RATE_LIMIT_INITIAL_RPS = 2.0  # Запросов в секунду на старте
+RATE_LIMIT_MIN_RPS = 0.2
+RATE_LIMIT_MAX_RPS = 10.0
+RATE_LIMIT_BURST = 5  # Сколько запросов можно отправить подряд без ожидания
+RATE_LIMIT_TARGET_LATENCY = 2.0  # Ответы медленнее (в секундах) снижают скорость
+
+# Повторы запросов при 429/5xx и сетевых ошибках
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_BASE = 1.0  # Секунды, удваиваются с каждой попыткой (со случайным разбросом)
+HTTP_BACKOFF_MAX = 30.0  # Дольше этого между попытками не ждём
+
+# Размыкатель: после стольких ошибок подряд запросы к сайту сразу отклоняются
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 120  # Через сколько секунд пробовать снова
+
+# Выгрузка лотов (/export): Excel, CSV, Parquet (для Parquet нужен pyarrow)
+EXPORT_TMP_DIR = None  # Каталог временных файлов выгрузки (None — системный)
+EXPORT_BATCH_ROWS = 10000  # Строк в одной группе Parquet
+EXPORT_CACHE_DIR = "export_cache"  # Готовые выгрузки для повторных запросов с теми же фильтрами
+EXPORT_CACHE_MAX_MB = 200  # Предельный размер кэша, сверх него удаляются давно не запрошенные файлы
+EXPORT_CACHE_MAX_AGE_HOURS = 24  # Файлы старше этого удаляются, даже если данные не менялись
+
+# Резервные копии базы (SQLite online backup API, без остановки приложения)
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 14  # Сколько последних копий каждой базы хранить
+BACKUP_COMPRESS = True  # Сжимать копии gzip
+BACKUP_PAGES_PER_STEP = 1024  # Страниц базы за один шаг копирования
+BACKUP_STEP_SLEEP = 0.05  # Пауза между шагами (секунды), чтобы не мешать записи
 
 # URL сайта
 TORGI_BASE_URL = "https://torgi.gov.ru/new/public/lots/reg"
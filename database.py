@@ -1,47 +1,273 @@
 # Модуль для работы с базой данных
 import sqlite3
 import json
+import base64
+import hashlib
+import logging
+import os
+import threading
+import re
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 import config
 
+logger = logging.getLogger(__name__)
+
+# Имя профиля фильтров по умолчанию
+DEFAULT_FILTER_PROFILE = 'default'
+
+# Поля, которые приходят со страницы списка лотов (детали лота их не перезаписывают)
+LISTING_FIELDS = ('title', 'lot_type', 'initial_price', 'current_price', 'application_deadline', 'status')
+
+# Столбцы таблицы lots, которые можно запросить у get_lots_page
+LOT_COLUMNS = (
+    'id', 'lot_number', 'title', 'lot_type', 'initial_price', 'current_price',
+    'currency', 'region', 'address', 'application_deadline', 'status',
+    'organizer', 'lot_url', 'created_at', 'updated_at', 'first_seen_at'
+)
+
+# Версия схемы базы (PRAGMA user_version)
+SCHEMA_VERSION = 6
+
+# Поля лота, которые хранятся в справочниках: поле -> таблица справочника
+DICTIONARY_TABLES = {
+    'region': 'regions',
+    'status': 'statuses',
+    'lot_type': 'lot_types',
+    'organizer': 'organizers',
+}
+
+# Столбцы, которые get_lot и get_all_lots возвращают для лота
+_LOT_SELECT_COLUMNS = LOT_COLUMNS + ('listing_fingerprint',)
+
+def _lots_view_select(table: str, extra: str = '') -> str:
+    """SELECT лотов таблицы table с названиями из справочников (основа lots_view)"""
+    return f'''
+            SELECT
+                lots.id, lots.lot_number, lots.title, lot_types.name AS lot_type,
+                lots.initial_price, lots.current_price, lots.currency,
+                regions.name AS region, lots.address, lots.application_deadline,
+                statuses.name AS status, organizers.name AS organizer, lots.lot_url,
+                lots.created_at, lots.updated_at, lots.first_seen_at, lots.listing_fingerprint,
+                lots.content_hash, lots.region_id, lots.status_id, lots.lot_type_id, lots.organizer_id{extra}
+            FROM {table} AS lots
+            LEFT JOIN lot_types ON lot_types.id = lots.lot_type_id
+            LEFT JOIN regions ON regions.id = lots.region_id
+            LEFT JOIN statuses ON statuses.id = lots.status_id
+            LEFT JOIN organizers ON organizers.id = lots.organizer_id
+        '''
+
+# Разрезы сводной статистики lot_stats: разрез -> столбец лота (None — все лоты, ключ 0)
+STATS_DIMENSIONS = {
+    'all': None,
+    'region': 'region_id',
+    'status': 'status_id',
+    'lot_type': 'lot_type_id',
+}
+
+def _stats_add_sql(dimension: str, column: Optional[str]) -> str:
+    """Учесть лот new в строке сводки его разреза (для триггеров lots)"""
+    key = f'COALESCE(new.{column}, 0)' if column else '0'
+    return f'''
+        INSERT INTO lot_stats (dimension, key_id, lots, priced, price_sum, min_price, max_price)
+        VALUES ('{dimension}', {key}, 1, new.current_price IS NOT NULL, COALESCE(new.current_price, 0),
+                new.current_price, new.current_price)
+        ON CONFLICT(dimension, key_id) DO UPDATE SET
+            lots = lots + 1,
+            priced = priced + excluded.priced,
+            price_sum = price_sum + excluded.price_sum,
+            min_price = COALESCE(MIN(min_price, excluded.min_price), min_price, excluded.min_price),
+            max_price = COALESCE(MAX(max_price, excluded.max_price), max_price, excluded.max_price);'''
+
+def _stats_remove_sql(dimension: str, column: Optional[str]) -> str:
+    """Исключить лот old из строки сводки его разреза (для триггеров lots).
+
+    Минимум и максимум пересчитываются по таблице, только если уходящая
+    цена была одной из крайних — это редкость, обычно хватает счётчиков.
+    """
+    key = f'COALESCE(old.{column}, 0)' if column else '0'
+    group = f' WHERE {column} IS old.{column}' if column else ''
+    return f'''
+        UPDATE lot_stats SET
+            lots = lots - 1,
+            priced = priced - (old.current_price IS NOT NULL),
+            price_sum = price_sum - COALESCE(old.current_price, 0)
+        WHERE dimension = '{dimension}' AND key_id = {key};
+        UPDATE lot_stats SET
+            min_price = (SELECT MIN(current_price) FROM lots{group}),
+            max_price = (SELECT MAX(current_price) FROM lots{group})
+        WHERE dimension = '{dimension}' AND key_id = {key} AND old.current_price IN (min_price, max_price);'''
+
+def archive_path_for(db_path: str) -> str:
+    """Путь к архиву завершённых лотов рядом с базой (auctions.db -> auctions_archive.db)"""
+    return f"{os.path.splitext(db_path)[0]}_archive.db"
+
+def _chunks(items: List, size: int = 500):
+    """Разбить список на части (ограничение SQLite на число параметров запроса)"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def encode_cursor(sort_key, lot_id: int) -> str:
+    """Курсор постраничной выборки: ключ сортировки и id последнего выданного лота"""
+    payload = json.dumps([sort_key, lot_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[object, int]:
+    """Разобрать курсор (ValueError, если он некорректен)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_key, lot_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(sort_key, (str, int, float)):
+            raise TypeError(sort_key)
+        return sort_key, int(lot_id)
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+# Столбцы полнотекстового индекса и их веса в bm25 (название важнее адреса и т.д.)
+SEARCH_COLUMNS = ('title', 'address', 'organizer', 'region')
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# Окончания, которые отбрасываются у русских слов в поисковом запросе (самые длинные сначала)
+_RU_ENDINGS = tuple(sorted((
+    'ыми', 'ими', 'ого', 'его', 'ому', 'ему', 'ией', 'иях', 'ами', 'ями', 'ость', 'ости',
+    'ый', 'ий', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ых', 'их', 'ую', 'юю',
+    'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ей',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+), key=len, reverse=True))
+_CYRILLIC_WORD_RE = re.compile(r'^[а-яё]+$')
+_RU_VOWELS = frozenset('аеёиоуыэюя')
+_TOKEN_RE = re.compile(r'\w+')
+
+def _stem(token: str) -> str:
+    """Грубая основа русского слова: отбрасываем окончание, оставляя не меньше 3 букв"""
+    if not _CYRILLIC_WORD_RE.match(token):
+        return token
+    for ending in _RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= 3:
+            token = token[:-len(ending)]
+            break
+    # Беглая гласная: "участки" -> "участк", но "участок" — ищем по "участ"
+    if len(token) >= 5 and token[-1] in 'кц' and token[-2] not in _RU_VOWELS:
+        token = token[:-1]
+    return token
+
+def fts_query(text: str) -> Optional[str]:
+    """Поисковая строка пользователя -> запрос FTS5.
+    
+    Каждое слово ищется по основе как префикс ("земельный" -> "земельн"*),
+    все слова должны встретиться. Слово из нескольких частей (кадастровый
+    номер 54:35:0101) ищется как фраза, последняя часть — префиксом.
+    """
+    terms = []
+    for word in text.lower().split():
+        tokens = _TOKEN_RE.findall(word)
+        if not tokens:
+            continue
+        tokens[-1] = _stem(tokens[-1])
+        terms.append('"' + ' '.join(tokens) + '"*')
+    return ' AND '.join(terms) or None
+
+# Поля журнала изменений, для которых имеет смысл рост/снижение (?direction=)
+PRICE_CHANGE_FIELDS = ('initial_price', 'current_price')
+
+# Поля лота, из которых считается хэш содержимого (изменение любого — повод для записи)
+CONTENT_FIELDS = (
+    'title', 'lot_type', 'initial_price', 'current_price', 'currency', 'region',
+    'address', 'application_deadline', 'status', 'organizer', 'lot_url'
+)
+
+def _content_value(value):
+    """Значение поля для сравнения: пустая строка и NULL — одно и то же"""
+    return None if value == '' else value
+
+def content_hash(lot_data: Dict) -> str:
+    """Хэш содержимого лота: совпадает, если ни одно из CONTENT_FIELDS не изменилось"""
+    values = [_content_value(lot_data.get(field)) for field in CONTENT_FIELDS]
+    payload = json.dumps(values, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def listing_fingerprint(lot_data: Dict) -> str:
+    """Отпечаток данных лота со страницы списка (для инкрементального обхода)"""
+    values = [lot_data.get(field) for field in LISTING_FIELDS]
+    payload = json.dumps(values, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
 class Database:
-    def __init__(self, db_path: str = config.DATABASE_PATH):
+    def __init__(self, db_path: str = config.DATABASE_PATH, archive_path: Optional[str] = None):
         self.db_path = db_path
+        # Архив завершённых лотов подключается к каждому соединению как схема history
+        self.archive_path = archive_path or archive_path_for(db_path)
+        # Соединение у каждого потока своё и переиспользуется между вызовами
+        self._local = threading.local()
+        self._schema_ready = False
         self.init_database()
     
     def get_connection(self):
-        """Получить соединение с базой данных"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Получить соединение текущего потока с базой данных"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+                cached_statements=config.SQLITE_CACHED_STATEMENTS
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute('ATTACH DATABASE ? AS history', (self.archive_path,))
+            # Освобождённые страницы возвращаются постепенно (incremental_vacuum), а не полным
+            # VACUUM. Режим должен быть задан до того, как в пустом файле появится первая
+            # страница (в том числе до перехода в WAL); старую базу переводит миграция 4.
+            conn.execute('PRAGMA main.auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA history.auto_vacuum = INCREMENTAL')
+            conn.execute(f'PRAGMA journal_mode = {config.SQLITE_JOURNAL_MODE}')
+            conn.execute(f'PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}')
+            conn.execute(f'PRAGMA busy_timeout = {int(config.SQLITE_BUSY_TIMEOUT_MS)}')
+            conn.execute(f'PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE)}')
+            conn.execute(f'PRAGMA history.journal_mode = {config.SQLITE_JOURNAL_MODE}')
+            conn.execute(f'PRAGMA history.synchronous = {config.SQLITE_SYNCHRONOUS}')
+            if self._schema_ready:
+                self._create_temp_views(conn)
+            self._local.conn = conn
         return conn
     
+    @staticmethod
+    def _create_temp_views(conn):
+        """Представления поверх основной базы и архива (TEMP — обычные не могут ссылаться на history)"""
+        conn.execute(
+            'CREATE TEMP VIEW IF NOT EXISTS history_lots_view AS'
+            + _lots_view_select('history.lots', extra=', lots.archived_at')
+        )
+        # Все лоты — активные и перенесённые в архив — для исторических запросов
+        conn.execute('''
+            CREATE TEMP VIEW IF NOT EXISTS all_lots AS
+            SELECT *, NULL AS archived_at FROM main.lots_view
+            UNION ALL
+            SELECT * FROM history_lots_view
+        ''')
+    
+    def close(self):
+        """Закрыть соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
     def init_database(self):
-        """Инициализация базы данных - создание таблиц"""
+        """Инициализация базы данных - создание таблиц и миграции схемы"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        # Справочники регионов, статусов, видов торгов и организаторов
+        for table in DICTIONARY_TABLES.values():
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE NOT NULL
+                )
+            ''')
+        
         # Таблица для хранения лотов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS lots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                lot_number TEXT UNIQUE NOT NULL,
-                title TEXT NOT NULL,
-                lot_type TEXT,
-                initial_price REAL,
-                current_price REAL,
-                currency TEXT,
-                region TEXT,
-                address TEXT,
-                application_deadline TEXT,
-                status TEXT,
-                organizer TEXT,
-                lot_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        cursor.execute(self._lots_table_sql('lots'))
         
         # Таблица для хранения истории изменений статусов
         cursor.execute('''
@@ -66,163 +292,946 @@ class Database:
             )
         ''')
         
-        # Индексы для ускорения поиска
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lot_number ON lots(lot_number)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON lots(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_region ON lots(region)')
+        # Состояние инкрементального обхода для каждого набора фильтров
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_state (
+                filter_key TEXT PRIMARY KEY,
+                high_water_mark TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Миграция: фильтры хранятся именованными профилями, имя уникально
+        cursor.execute(
+            "UPDATE filters SET filter_name = ? WHERE filter_name = 'last_filters' OR filter_name IS NULL",
+            (DEFAULT_FILTER_PROFILE,)
+        )
+        cursor.execute('DELETE FROM filters WHERE id NOT IN (SELECT MAX(id) FROM filters GROUP BY filter_name)')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_filters_name ON filters(filter_name)')
+        
+        # Миграция: отпечаток данных со страницы списка
+        columns = {row['name'] for row in cursor.execute('PRAGMA table_info(lots)')}
+        if 'listing_fingerprint' not in columns:
+            cursor.execute('ALTER TABLE lots ADD COLUMN listing_fingerprint TEXT')
+        conn.commit()
+        
+        # Миграция 1: регион, статус, вид торгов и организатор — ссылки на справочники
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            self._migrate_to_dictionaries(conn)
+        
+        # Миграция 2: хэш содержимого лота (у старых лотов заполнится при следующей записи)
+        if version < 2:
+            columns = {row['name'] for row in cursor.execute('PRAGMA table_info(lots)')}
+            if 'content_hash' not in columns:
+                cursor.execute('ALTER TABLE lots ADD COLUMN content_hash TEXT')
+            # Индекс поиска переписывается, только если проиндексированные поля действительно изменились
+            cursor.execute('DROP TRIGGER IF EXISTS lots_fts_update')
+            conn.commit()
+        
+        # Журнал изменений полей лотов (только добавление). Поле — ссылка на справочник
+        # change_fields, время — секунды Unix: строки короткие, диапазоны по времени дешёвые.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_fields (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lot_changes (
+                id INTEGER PRIMARY KEY,
+                lot_id INTEGER NOT NULL REFERENCES lots(id),
+                field_id INTEGER NOT NULL REFERENCES change_fields(id),
+                old_value,
+                new_value,
+                changed_at INTEGER NOT NULL
+            )
+        ''')
+        # Хронология лота, изменения за период и изменения одного поля за период
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lot_changes_lot ON lot_changes(lot_id, changed_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lot_changes_time ON lot_changes(changed_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lot_changes_field_time ON lot_changes(field_id, changed_at)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_status_history_lot ON status_history(lot_number, changed_at)'
+        )
+        
+        # Миграция 3: перенос истории статусов в общий журнал изменений
+        if version < 3:
+            status_field = self._dictionary_ids(cursor, 'change_fields', ['status'])['status']
+            cursor.execute('''
+                INSERT INTO lot_changes (lot_id, field_id, old_value, new_value, changed_at)
+                SELECT lots.id, ?, status_history.old_status, status_history.new_status,
+                       CAST(strftime('%s', status_history.changed_at) AS INTEGER)
+                FROM status_history JOIN lots ON lots.lot_number = status_history.lot_number
+                ORDER BY status_history.id
+            ''', (status_field,))
+            conn.commit()
+        
+        # Миграция 4: перевод существующей базы в режим incremental auto_vacuum (один раз)
+        if version < 4 and cursor.execute('PRAGMA main.auto_vacuum').fetchone()[0] != 2:
+            conn.commit()
+            logger.info("Перевод базы в режим incremental auto_vacuum (однократный VACUUM)...")
+            cursor.execute('VACUUM main')
+        
+        # Архив завершённых лотов — та же структура плюс момент переноса
+        cursor.execute(self._lots_table_sql('history.lots'))
+        columns = {row['name'] for row in cursor.execute('PRAGMA history.table_info(lots)')}
+        if 'archived_at' not in columns:
+            cursor.execute('ALTER TABLE history.lots ADD COLUMN archived_at TIMESTAMP')
+        cursor.execute('CREATE INDEX IF NOT EXISTS history.idx_archive_created ON lots(created_at DESC, id DESC)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS history.idx_archive_region_created ON lots(region_id, created_at DESC, id DESC)'
+        )
+        
+        # Лоты вместе с названиями из справочников — через это представление идут все чтения.
+        # Набор столбцов меняется вместе со схемой, поэтому при миграции представление пересоздаётся.
+        if version < SCHEMA_VERSION:
+            cursor.execute('DROP VIEW IF EXISTS lots_view')
+        cursor.execute('CREATE VIEW IF NOT EXISTS lots_view AS' + _lots_view_select('lots'))
+        
+        # Полнотекстовый индекс по названию, адресу, организатору и региону.
+        # Содержимое берётся из lots_view, индекс поддерживают триггеры.
+        # Если SQLite собран без FTS5, поиск работает через LIKE.
+        try:
+            fts_exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lots_fts'"
+            ).fetchone()
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS lots_fts USING fts5(
+                    title, address, organizer, region,
+                    content='lots_view', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS lots_fts_insert AFTER INSERT ON lots BEGIN
+                    INSERT INTO lots_fts (rowid, title, address, organizer, region)
+                    VALUES (new.id, new.title, new.address,
+                            (SELECT name FROM organizers WHERE id = new.organizer_id),
+                            (SELECT name FROM regions WHERE id = new.region_id));
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS lots_fts_delete AFTER DELETE ON lots BEGIN
+                    INSERT INTO lots_fts (lots_fts, rowid, title, address, organizer, region)
+                    VALUES ('delete', old.id, old.title, old.address,
+                            (SELECT name FROM organizers WHERE id = old.organizer_id),
+                            (SELECT name FROM regions WHERE id = old.region_id));
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS lots_fts_update
+                AFTER UPDATE OF title, address, organizer_id, region_id ON lots
+                WHEN old.title IS NOT new.title OR old.address IS NOT new.address
+                    OR old.organizer_id IS NOT new.organizer_id OR old.region_id IS NOT new.region_id
+                BEGIN
+                    INSERT INTO lots_fts (lots_fts, rowid, title, address, organizer, region)
+                    VALUES ('delete', old.id, old.title, old.address,
+                            (SELECT name FROM organizers WHERE id = old.organizer_id),
+                            (SELECT name FROM regions WHERE id = old.region_id));
+                    INSERT INTO lots_fts (rowid, title, address, organizer, region)
+                    VALUES (new.id, new.title, new.address,
+                            (SELECT name FROM organizers WHERE id = new.organizer_id),
+                            (SELECT name FROM regions WHERE id = new.region_id));
+                END
+            ''')
+            if not fts_exists:
+                # Индекс создан впервые — заполняем его уже сохранёнными лотами
+                cursor.execute("INSERT INTO lots_fts (lots_fts) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            self.fts_enabled = False
+        
+        # Индексы под запросы списка лотов: фильтр по справочнику + новые сначала
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lots_created ON lots(created_at DESC, id DESC)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_lots_region_created ON lots(region_id, created_at DESC, id DESC)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_lots_status_created ON lots(status_id, created_at DESC, id DESC)'
+        )
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_lots_region_status_created '
+            'ON lots(region_id, status_id, created_at DESC, id DESC)'
+        )
+        
+        # Сводная статистика по лотам (счётчики, сумма, минимум и максимум цены) в разрезах
+        # STATS_DIMENSIONS; её поддерживают триггеры, поэтому /api/stats не читает таблицу lots
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lot_stats (
+                dimension TEXT NOT NULL,
+                key_id INTEGER NOT NULL,
+                lots INTEGER NOT NULL DEFAULT 0,
+                priced INTEGER NOT NULL DEFAULT 0,
+                price_sum REAL NOT NULL DEFAULT 0,
+                min_price REAL,
+                max_price REAL,
+                PRIMARY KEY (dimension, key_id)
+            ) WITHOUT ROWID
+        ''')
+        # Минимум/максимум по всем лотам пересчитываются по индексу, а не чтением таблицы
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lots_price ON lots(current_price)')
+        cursor.execute(
+            'CREATE TRIGGER IF NOT EXISTS lot_stats_insert AFTER INSERT ON lots BEGIN'
+            + ''.join(_stats_add_sql(dimension, column) for dimension, column in STATS_DIMENSIONS.items())
+            + ' END'
+        )
+        cursor.execute(
+            'CREATE TRIGGER IF NOT EXISTS lot_stats_delete AFTER DELETE ON lots BEGIN'
+            + ''.join(_stats_remove_sql(dimension, column) for dimension, column in STATS_DIMENSIONS.items())
+            + ' END'
+        )
+        cursor.execute(
+            'CREATE TRIGGER IF NOT EXISTS lot_stats_update '
+            'AFTER UPDATE OF region_id, status_id, lot_type_id, current_price ON lots '
+            'WHEN old.region_id IS NOT new.region_id OR old.status_id IS NOT new.status_id '
+            'OR old.lot_type_id IS NOT new.lot_type_id OR old.current_price IS NOT new.current_price BEGIN'
+            + ''.join(
+                _stats_add_sql(dimension, column) + _stats_remove_sql(dimension, column)
+                for dimension, column in STATS_DIMENSIONS.items()
+            )
+            + ' END'
+        )
+        
+        # Версия данных лотов: одна строка, её увеличивает любая запись в lots (в том числе
+        # перенос в архив и обратно). По ней /api/lots отвечает 304, не читая лоты
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS lots_data_version_{event.lower()} AFTER {event} ON lots BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
         
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
-        conn.close()
+        
+        self._schema_ready = True
+        self._create_temp_views(conn)
+        
+        # Миграция 5: первое заполнение сводной статистики уже сохранёнными лотами
+        if version < 5:
+            self.reconcile_stats()
     
-    def save_lot(self, lot_data: Dict) -> bool:
-        """Сохранить или обновить лот в базе данных"""
-        conn = self.get_connection()
+    @staticmethod
+    def _lots_table_sql(name: str) -> str:
+        return f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lot_number TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                lot_type_id INTEGER REFERENCES lot_types(id),
+                initial_price REAL,
+                current_price REAL,
+                currency TEXT,
+                region_id INTEGER REFERENCES regions(id),
+                address TEXT,
+                application_deadline TEXT,
+                status_id INTEGER REFERENCES statuses(id),
+                organizer_id INTEGER REFERENCES organizers(id),
+                lot_url TEXT,
+                listing_fingerprint TEXT,
+                content_hash TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        '''
+    
+    def _migrate_to_dictionaries(self, conn):
+        """Перенести текстовые region/status/lot_type/organizer в справочники.
+        
+        Таблица lots пересоздаётся с целочисленными ссылками (одной транзакцией),
+        старые индексы и полнотекстовый индекс поверх прежней таблицы удаляются.
+        """
         cursor = conn.cursor()
+        columns = {row['name'] for row in cursor.execute('PRAGMA table_info(lots)')}
+        if 'region_id' in columns:
+            return
         
-        lot_number = lot_data.get('lot_number', '')
-        if not lot_number:
-            conn.close()
-            return False
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for trigger in ('lots_fts_insert', 'lots_fts_delete', 'lots_fts_update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute('DROP TABLE IF EXISTS lots_fts')
+            for index in ('idx_lot_number', 'idx_status', 'idx_region', 'idx_lots_created'):
+                cursor.execute(f'DROP INDEX IF EXISTS {index}')
+            
+            for field, table in DICTIONARY_TABLES.items():
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO {table} (name)
+                    SELECT DISTINCT {field} FROM lots WHERE {field} IS NOT NULL AND {field} != ''
+                ''')
+            
+            cursor.execute(self._lots_table_sql('lots_new'))
+            cursor.execute('''
+                INSERT INTO lots_new (
+                    id, lot_number, title, lot_type_id, initial_price, current_price,
+                    currency, region_id, address, application_deadline, status_id,
+                    organizer_id, lot_url, listing_fingerprint, created_at, updated_at, first_seen_at
+                )
+                SELECT
+                    lots.id, lots.lot_number, lots.title, lot_types.id, lots.initial_price, lots.current_price,
+                    lots.currency, regions.id, lots.address, lots.application_deadline, statuses.id,
+                    organizers.id, lots.lot_url, lots.listing_fingerprint, lots.created_at, lots.updated_at,
+                    lots.first_seen_at
+                FROM lots
+                LEFT JOIN lot_types ON lot_types.name = lots.lot_type
+                LEFT JOIN regions ON regions.name = lots.region
+                LEFT JOIN statuses ON statuses.name = lots.status
+                LEFT JOIN organizers ON organizers.name = lots.organizer
+            ''')
+            cursor.execute('DROP TABLE lots')
+            cursor.execute('ALTER TABLE lots_new RENAME TO lots')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def _dictionary_ids(self, cursor, table: str, names) -> Dict[str, int]:
+        """id значений справочника (недостающие значения добавляются)"""
+        names = sorted({name for name in names if name})
+        if not names:
+            return {}
+        cursor.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', [(name,) for name in names])
+        ids = {}
+        for chunk in _chunks(names):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT id, name FROM {table} WHERE name IN ({placeholders})', chunk)
+            ids.update((row['name'], row['id']) for row in cursor.fetchall())
+        return ids
+    
+    def save_lot(self, lot_data: Dict) -> bool:
+        """Сохранить или обновить лот в базе данных (True — лот новый)"""
+        return bool(self.save_lots([lot_data])['new'])
+    
+    def save_lots(self, lots: List[Dict], details_missing: Iterable[str] = ()) -> Dict[str, List]:
+        """Сохранить пачку лотов одной транзакцией.
         
-        # Проверяем, существует ли лот
-        cursor.execute('SELECT * FROM lots WHERE lot_number = ?', (lot_number,))
-        existing = cursor.fetchone()
+        Лот записывается, только если изменился его хэш содержимого
+        (content_hash), поэтому updated_at меняется лишь при реальных изменениях.
+        details_missing — номера лотов, детали которых загрузить не удалось:
+        пустые поля таких лотов берутся из сохранённых, а не затираются.
+        Возвращает словарь:
+            new       — список новых лотов;
+            changed   — список троек (лот, прежний статус, список изменившихся полей);
+            unchanged — список пар (лот, прежний статус) для лотов без изменений.
+        """
+        result = {'new': [], 'changed': [], 'unchanged': []}
         
-        if existing:
-            # Обновляем существующий лот
-            old_status = existing['status']
-            new_status = lot_data.get('status', '')
+        # Лоты без номера пропускаем, при повторе номера в пачке побеждает последний
+        batch: Dict[str, Dict] = {}
+        for lot_data in lots:
+            lot_number = lot_data.get('lot_number', '')
+            if lot_number:
+                batch[lot_number] = lot_data
+        if not batch:
+            return result
+        
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            # Сохранённое содержимое известных лотов — одним запросом на каждые 500 номеров
+            previous: Dict[str, sqlite3.Row] = {}
+            for chunk in _chunks(list(batch)):
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(
+                    f"SELECT id, lot_number, content_hash, {', '.join(CONTENT_FIELDS)} "
+                    f"FROM lots_view WHERE lot_number IN ({placeholders})", chunk
+                )
+                previous.update((row['lot_number'], row) for row in cursor.fetchall())
             
-            # Если статус изменился, сохраняем в историю
-            if old_status != new_status:
-                cursor.execute('''
+            # Лоты, которых нет среди активных, могли быть перенесены в архив
+            archived: Dict[str, sqlite3.Row] = {}
+            missing = [lot_number for lot_number in batch if lot_number not in previous]
+            for chunk in _chunks(missing):
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(
+                    f"SELECT id, lot_number, content_hash, {', '.join(CONTENT_FIELDS)} "
+                    f"FROM history_lots_view WHERE lot_number IN ({placeholders})", chunk
+                )
+                archived.update((row['lot_number'], row) for row in cursor.fetchall())
+            
+            # Неизвестные из-за ошибки загрузки поля — прежние, иначе лот «изменится» на пустые
+            for lot_number in details_missing:
+                stored = previous.get(lot_number) or archived.get(lot_number)
+                lot_data = batch.get(lot_number)
+                if stored is None or lot_data is None:
+                    continue
+                for field in CONTENT_FIELDS:
+                    if _content_value(lot_data.get(field)) is None and stored[field] is not None:
+                        lot_data[field] = stored[field]
+            
+            # Изменившийся архивный лот возвращается в активные с прежним id
+            # (на него ссылается журнал изменений), не изменившийся остаётся в архиве
+            restore = [
+                lot_number for lot_number, row in archived.items()
+                if row['content_hash'] != content_hash(batch[lot_number])
+            ]
+            if restore:
+                self._restore_archived(cursor, restore)
+                previous.update((lot_number, archived[lot_number]) for lot_number in restore)
+            
+            to_write = []
+            history = []
+            changes = []
+            now = int(time.time())
+            for lot_number, lot_data in batch.items():
+                new_hash = content_hash(lot_data)
+                stored = previous.get(lot_number)
+                if stored is None and lot_number in archived:
+                    result['unchanged'].append((lot_data, archived[lot_number]['status']))
+                    continue
+                if stored is None:
+                    result['new'].append(lot_data)
+                    to_write.append((lot_number, lot_data, new_hash))
+                    continue
+                
+                old_status = stored['status']
+                if stored['content_hash'] == new_hash:
+                    result['unchanged'].append((lot_data, old_status))
+                    continue
+                
+                changed_fields = [
+                    field for field in CONTENT_FIELDS
+                    if _content_value(stored[field]) != _content_value(lot_data.get(field))
+                ]
+                # Хэша ещё нет (лот сохранён до миграции) — записываем его, но лот не изменился
+                to_write.append((lot_number, lot_data, new_hash))
+                if not changed_fields:
+                    result['unchanged'].append((lot_data, old_status))
+                    continue
+                result['changed'].append((lot_data, old_status, changed_fields))
+                changes.extend(
+                    (stored['id'], field, _content_value(stored[field]), _content_value(lot_data.get(field)), now)
+                    for field in changed_fields
+                )
+                if 'status' in changed_fields:
+                    history.append((lot_number, old_status, lot_data.get('status', '')))
+            
+            if not to_write:
+                conn.commit()
+                return result
+            
+            # Ссылки на справочники для значений записываемых лотов
+            ids = {
+                field: self._dictionary_ids(cursor, table, (lot.get(field) for _, lot, _ in to_write))
+                for field, table in DICTIONARY_TABLES.items()
+            }
+            
+            cursor.executemany('''
+                INSERT INTO lots (
+                    lot_number, title, lot_type_id, initial_price, current_price,
+                    currency, region_id, address, application_deadline, status_id,
+                    organizer_id, lot_url, listing_fingerprint, content_hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(lot_number) DO UPDATE SET
+                    title = excluded.title,
+                    lot_type_id = excluded.lot_type_id,
+                    initial_price = excluded.initial_price,
+                    current_price = excluded.current_price,
+                    currency = excluded.currency,
+                    region_id = excluded.region_id,
+                    address = excluded.address,
+                    application_deadline = excluded.application_deadline,
+                    status_id = excluded.status_id,
+                    organizer_id = excluded.organizer_id,
+                    lot_url = excluded.lot_url,
+                    listing_fingerprint = excluded.listing_fingerprint,
+                    content_hash = excluded.content_hash,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE lots.content_hash IS NOT excluded.content_hash
+            ''', [
+                (
+                    lot_number,
+                    lot_data.get('title', ''),
+                    ids['lot_type'].get(lot_data.get('lot_type')),
+                    lot_data.get('initial_price'),
+                    lot_data.get('current_price'),
+                    lot_data.get('currency', ''),
+                    ids['region'].get(lot_data.get('region')),
+                    lot_data.get('address', ''),
+                    lot_data.get('application_deadline', ''),
+                    ids['status'].get(lot_data.get('status')),
+                    ids['organizer'].get(lot_data.get('organizer')),
+                    lot_data.get('lot_url', ''),
+                    listing_fingerprint(lot_data),
+                    new_hash
+                )
+                for lot_number, lot_data, new_hash in to_write
+            ])
+            
+            if history:
+                cursor.executemany('''
                     INSERT INTO status_history (lot_number, old_status, new_status)
                     VALUES (?, ?, ?)
-                ''', (lot_number, old_status, new_status))
+                ''', history)
             
-            cursor.execute('''
-                UPDATE lots SET
-                    title = ?,
-                    lot_type = ?,
-                    initial_price = ?,
-                    current_price = ?,
-                    currency = ?,
-                    region = ?,
-                    address = ?,
-                    application_deadline = ?,
-                    status = ?,
-                    organizer = ?,
-                    lot_url = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE lot_number = ?
-            ''', (
-                lot_data.get('title', ''),
-                lot_data.get('lot_type', ''),
-                lot_data.get('initial_price'),
-                lot_data.get('current_price'),
-                lot_data.get('currency', ''),
-                lot_data.get('region', ''),
-                lot_data.get('address', ''),
-                lot_data.get('application_deadline', ''),
-                lot_data.get('status', ''),
-                lot_data.get('organizer', ''),
-                lot_data.get('lot_url', ''),
-                lot_number
-            ))
-            is_new = False
-        else:
-            # Вставляем новый лот
-            cursor.execute('''
-                INSERT INTO lots (
-                    lot_number, title, lot_type, initial_price, current_price,
-                    currency, region, address, application_deadline, status,
-                    organizer, lot_url
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                lot_number,
-                lot_data.get('title', ''),
-                lot_data.get('lot_type', ''),
-                lot_data.get('initial_price'),
-                lot_data.get('current_price'),
-                lot_data.get('currency', ''),
-                lot_data.get('region', ''),
-                lot_data.get('address', ''),
-                lot_data.get('application_deadline', ''),
-                lot_data.get('status', ''),
-                lot_data.get('organizer', ''),
-                lot_data.get('lot_url', '')
-            ))
-            is_new = True
+            if changes:
+                field_ids = self._dictionary_ids(cursor, 'change_fields', (change[1] for change in changes))
+                cursor.executemany('''
+                    INSERT INTO lot_changes (lot_id, field_id, old_value, new_value, changed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [
+                    (lot_id, field_ids[field], old_value, new_value, changed_at)
+                    for lot_id, field, old_value, new_value, changed_at in changes
+                ])
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         
-        conn.commit()
-        conn.close()
-        return is_new
+        return result
+    
+    # Столбцы таблицы lots (и архивной history.lots) для переноса строк между ними
+    _LOTS_TABLE_COLUMNS = (
+        'id, lot_number, title, lot_type_id, initial_price, current_price, currency, '
+        'region_id, address, application_deadline, status_id, organizer_id, lot_url, '
+        'listing_fingerprint, content_hash, created_at, updated_at, first_seen_at'
+    )
+    
+    def _restore_archived(self, cursor, lot_numbers: List[str]):
+        """Вернуть лоты из архива в таблицу lots (в текущей транзакции)"""
+        columns = self._LOTS_TABLE_COLUMNS
+        for chunk in _chunks(lot_numbers):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO main.lots ({columns})
+                SELECT {columns} FROM history.lots WHERE lot_number IN ({placeholders})
+            ''', chunk)
+            cursor.execute(f'DELETE FROM history.lots WHERE lot_number IN ({placeholders})', chunk)
+            self._count_archived(cursor, -cursor.rowcount)
+        logger.info(f"Из архива возвращено лотов: {len(lot_numbers)}")
+    
+    def archive_finished_lots(self, older_than_days: float = config.LOTS_ARCHIVE_AFTER_DAYS,
+                              statuses: Iterable[str] = config.LOTS_ARCHIVE_STATUSES,
+                              batch_size: int = config.LOTS_ARCHIVE_BATCH) -> Dict:
+        """Перенести завершённые лоты, не менявшиеся older_than_days дней, в архив.
+        
+        Перенос идёт пачками по batch_size, каждая пачка — своя короткая
+        транзакция, так что сборщик и веб-интерфейс не ждут долго. Строка
+        сначала пишется в архив и лишь потом удаляется из lots: при сбое между
+        ними лот окажется в обеих таблицах, и следующий запуск перезапишет
+        архивную копию. Освободившиеся страницы возвращает incremental_vacuum.
+        """
+        conn = self.get_connection()
+        statuses = list(statuses)
+        status_ids = [row[0] for row in conn.execute(
+            f"SELECT id FROM statuses WHERE name IN ({','.join('?' * len(statuses))})", statuses
+        )] if statuses else []
+        
+        moved = 0
+        if status_ids:
+            cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - older_than_days * 86400))
+            columns = self._LOTS_TABLE_COLUMNS
+            status_condition = self._id_condition('status_id', status_ids, [])
+            while True:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        f'SELECT id FROM main.lots WHERE updated_at < ?{status_condition} LIMIT ?',
+                        [cutoff] + status_ids + [batch_size]
+                    )
+                    ids = [row[0] for row in cursor.fetchall()]
+                    if not ids:
+                        break
+                    placeholders = ','.join('?' * len(ids))
+                    cursor.execute(f'''
+                        INSERT OR REPLACE INTO history.lots ({columns}, archived_at)
+                        SELECT {columns}, CURRENT_TIMESTAMP FROM main.lots WHERE id IN ({placeholders})
+                    ''', ids)
+                    cursor.execute(f'DELETE FROM main.lots WHERE id IN ({placeholders})', ids)
+                    self._count_archived(cursor, len(ids))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                moved += len(ids)
+        
+        freed_pages = self.incremental_vacuum()
+        logger.info(f"В архив перенесено лотов: {moved}, освобождено страниц: {freed_pages}")
+        return {'archived': moved, 'freed_pages': freed_pages}
+    
+    def incremental_vacuum(self, step_pages: int = config.LOTS_VACUUM_STEP_PAGES) -> int:
+        """Вернуть свободные страницы основной базы шагами по step_pages.
+        
+        Каждый шаг — отдельная короткая транзакция, между шагами другие
+        соединения успевают записать свои данные. Возвращает число
+        освобождённых страниц.
+        """
+        conn = self.get_connection()
+        freed = 0
+        free_pages = conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+        while free_pages:
+            conn.execute(f'PRAGMA main.incremental_vacuum({int(step_pages)})').fetchall()
+            conn.commit()
+            remaining = conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+            if remaining >= free_pages:
+                # База не в режиме incremental auto_vacuum — освобождать нечем
+                break
+            freed += free_pages - remaining
+            free_pages = remaining
+        return freed
+    
+    @staticmethod
+    def _count_archived(cursor, delta: int):
+        """Изменить счётчик архивных лотов в сводной статистике"""
+        cursor.execute('''
+            INSERT INTO lot_stats (dimension, key_id, lots) VALUES ('archived', 0, ?)
+            ON CONFLICT(dimension, key_id) DO UPDATE SET lots = lots + excluded.lots
+        ''', (delta,))
+    
+    def count_archived_lots(self) -> int:
+        """Количество лотов в архиве (из сводной статистики)"""
+        conn = self.get_connection()
+        row = conn.execute("SELECT lots FROM lot_stats WHERE dimension = 'archived' AND key_id = 0").fetchone()
+        return row[0] if row else 0
+    
+    @staticmethod
+    def _stats_row(row: sqlite3.Row) -> Dict:
+        """Строка lot_stats для API: счётчики, сумма и средняя цена, минимум и максимум"""
+        return {
+            'lots': row['lots'],
+            'priced': row['priced'],
+            'price_sum': round(row['price_sum'], 2),
+            'avg_price': round(row['price_sum'] / row['priced'], 2) if row['priced'] else None,
+            'min_price': row['min_price'],
+            'max_price': row['max_price'],
+        }
+    
+    def get_stats(self) -> Dict:
+        """Сводная статистика активных лотов: итог и разрезы по региону, статусу и виду торгов.
+        
+        Читается из lot_stats, поэтому время ответа зависит только от размера
+        справочников, а не от числа лотов.
+        """
+        conn = self.get_connection()
+        row = conn.execute("SELECT * FROM lot_stats WHERE dimension = 'all' AND key_id = 0").fetchone()
+        stats = {
+            'total': self._stats_row(row) if row else self._stats_row(
+                {'lots': 0, 'priced': 0, 'price_sum': 0.0, 'min_price': None, 'max_price': None}
+            ),
+            'archived': self.count_archived_lots(),
+        }
+        for dimension in STATS_DIMENSIONS:
+            if dimension == 'all':
+                continue
+            rows = conn.execute(f'''
+                SELECT lot_stats.*, {DICTIONARY_TABLES[dimension]}.name
+                FROM lot_stats
+                LEFT JOIN {DICTIONARY_TABLES[dimension]} ON {DICTIONARY_TABLES[dimension]}.id = lot_stats.key_id
+                WHERE lot_stats.dimension = ? AND lot_stats.lots > 0
+                ORDER BY lot_stats.lots DESC
+            ''', (dimension,)).fetchall()
+            stats[f'by_{dimension}'] = [{'name': row['name'], **self._stats_row(row)} for row in rows]
+        return stats
+    
+    def reconcile_stats(self) -> Dict:
+        """Пересчитать сводную статистику с нуля по таблицам lots и архива.
+        
+        Возвращает число строк сводки и список строк (разрез, ключ), значения
+        которых разошлись с пересчитанными.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        def snapshot():
+            return {
+                (row['dimension'], row['key_id']): (
+                    row['lots'], row['priced'], round(row['price_sum'], 2), row['min_price'], row['max_price']
+                )
+                for row in cursor.execute('SELECT * FROM lot_stats WHERE lots != 0')
+            }
+        
+        try:
+            before = snapshot()
+            cursor.execute('DELETE FROM lot_stats')
+            for dimension, column in STATS_DIMENSIONS.items():
+                key = f'COALESCE({column}, 0)' if column else '0'
+                cursor.execute(f'''
+                    INSERT INTO lot_stats (dimension, key_id, lots, priced, price_sum, min_price, max_price)
+                    SELECT ?, {key}, COUNT(*), COUNT(current_price), COALESCE(SUM(current_price), 0),
+                           MIN(current_price), MAX(current_price)
+                    FROM lots{f' GROUP BY {key}' if column else ''}
+                ''', (dimension,))
+            archived = cursor.execute('SELECT COUNT(*) FROM history.lots').fetchone()[0]
+            self._count_archived(cursor, archived)
+            after = snapshot()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        corrected = sorted(key for key in set(before) | set(after) if before.get(key) != after.get(key))
+        if corrected:
+            logger.info(f"Сводная статистика пересчитана, исправлено строк: {len(corrected)}")
+        return {'rows': len(after), 'corrected': corrected}
     
     def get_lot(self, lot_number: str) -> Optional[Dict]:
-        """Получить лот по номеру"""
+        """Получить лот по номеру (если среди активных его нет — из архива)"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM lots WHERE lot_number = ?', (lot_number,))
+        select = ', '.join(_LOT_SELECT_COLUMNS)
+        cursor.execute(f"SELECT {select} FROM lots_view WHERE lot_number = ?", (lot_number,))
         row = cursor.fetchone()
-        conn.close()
+        if row is None:
+            cursor.execute(
+                f"SELECT {select}, archived_at FROM history_lots_view WHERE lot_number = ?", (lot_number,)
+            )
+            row = cursor.fetchone()
         
         if row:
             return dict(row)
         return None
     
-    def get_all_lots(self, filters: Optional[Dict] = None) -> List[Dict]:
-        """Получить все лоты с опциональными фильтрами"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _filter_clause(self, filters: Optional[Dict]) -> Tuple[str, List, bool]:
+        """Часть запроса FROM ... WHERE ... и параметры для фильтров списка лотов.
         
-        query = 'SELECT * FROM lots WHERE 1=1'
+        Третий элемент — True, если выборка идёт через полнотекстовый индекс
+        и у строк есть ранг search_rank (bm25, меньше — релевантнее).
+        Регион и статус фильтруются по id справочника, чтобы работали
+        составные индексы (справочник, created_at, id). С filters['archived']
+        выборка идёт по all_lots — активным лотам вместе с архивом; поиск при
+        этом выполняется через LIKE (полнотекстовый индекс есть только у lots).
+        """
+        with_archive = bool(filters and filters.get('archived'))
+        query = ' FROM all_lots AS lots' if with_archive else ' FROM lots_view AS lots'
         params = []
+        ranked = False
+        
+        search = fts_query(filters.get('q') or '') if filters else None
+        use_fts = bool(search) and self.fts_enabled and not with_archive
+        if use_fts:
+            weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+            # CROSS JOIN фиксирует порядок: сначала поиск по индексу, потом лоты.
+            # Иначе при фильтре по региону планировщик выполняет MATCH для каждого лота.
+            query = f''' FROM (
+                SELECT rowid AS fts_id, bm25(lots_fts, {weights}) AS search_rank
+                FROM lots_fts WHERE lots_fts MATCH ?
+            ) AS fts CROSS JOIN lots_view AS lots ON lots.id = fts.fts_id'''
+            params.append(search)
+            ranked = True
+        query += ' WHERE 1=1'
         
         if filters:
+            if search and not use_fts:
+                # Запасной вариант без FTS5: каждое слово в любом из столбцов
+                for word in filters['q'].split():
+                    query += ' AND (' + ' OR '.join(f'lots.{column} LIKE ?' for column in SEARCH_COLUMNS) + ')'
+                    params.extend([f"%{word}%"] * len(SEARCH_COLUMNS))
+            # id справочника подставляются в запрос как значения: так планировщик
+            # видит равенство и идёт по составному индексу в нужном порядке
+            conn = self.get_connection()
             if filters.get('region'):
-                query += ' AND region LIKE ?'
-                params.append(f"%{filters['region']}%")
+                # LIKE выполняется по маленькому справочнику, а не по всем лотам
+                region_ids = [row[0] for row in conn.execute(
+                    'SELECT id FROM regions WHERE name LIKE ?', (f"%{filters['region']}%",)
+                )]
+                query += self._id_condition('lots.region_id', region_ids, params)
             if filters.get('status'):
-                query += ' AND status = ?'
-                params.append(filters['status'])
+                status_ids = [row[0] for row in conn.execute(
+                    'SELECT id FROM statuses WHERE name = ?', (filters['status'],)
+                )]
+                query += self._id_condition('lots.status_id', status_ids, params)
+        
+        return query, params, ranked
+    
+    @staticmethod
+    def _id_condition(column: str, ids: List[int], params: List) -> str:
+        """Условие column = ? / IN (...) для найденных id справочника"""
+        if not ids:
+            return ' AND 0'
+        params.extend(ids)
+        if len(ids) == 1:
+            return f' AND {column} = ?'
+        return f" AND {column} IN ({','.join('?' * len(ids))})"
+    
+    def get_all_lots(self, filters: Optional[Dict] = None) -> List[Dict]:
+        """Получить все лоты с опциональными фильтрами (с поиском ?q= — по релевантности)"""
+        return list(self.iter_lots(filters))
+    
+    def iter_lots(self, filters: Optional[Dict] = None, batch_size: int = 500) -> Iterator[Dict]:
+        """Все лоты с фильтрами по одному, из курсора базы (память не зависит от числа лотов)"""
+        conn = self.get_connection()
+        source, params, ranked = self._filter_clause(filters)
+        select = ', '.join(f'lots.{column}' for column in _LOT_SELECT_COLUMNS)
+        order = ' ORDER BY search_rank, lots.id' if ranked else ' ORDER BY lots.created_at DESC, lots.id DESC'
         
-        query += ' ORDER BY created_at DESC'
+        cursor = conn.execute(f'SELECT {select}' + source + order, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    
+    def _lots_page_query(self, filters: Optional[Dict], cursor: Optional[str], limit: int,
+                         columns: Optional[Iterable[str]], keys_only: bool = False,
+                         stream: bool = False, last_key: Optional[Tuple[object, int]] = None) -> Tuple[str, List, str]:
+        """SQL одной страницы лотов, его параметры и столбец ключа сортировки.
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        С keys_only — запрос ключей (sort_key, id) последнего лота страницы и
+        следующего за ним: по ним видно, есть ли следующая страница. Со stream —
+        запрос без LIMIT до ключа last_key включительно (или до конца выборки).
+        """
+        if columns:
+            unknown = [column for column in columns if column not in LOT_COLUMNS]
+            if unknown:
+                raise ValueError(f"Неизвестные столбцы: {', '.join(unknown)}")
+            selected = ['id', 'created_at'] + [c for c in columns if c not in ('id', 'created_at')]
+        else:
+            selected = list(LOT_COLUMNS)
         
-        return [dict(row) for row in rows]
+        source, params, ranked = self._filter_clause(filters)
+        select = ', '.join(f'lots.{column}' for column in selected)
+        if ranked:
+            select += ', search_rank'
+            sort_column, order = 'search_rank', ' ORDER BY search_rank, lots.id'
+            comparison = '(search_rank, lots.id) > (?, ?)'
+            last_comparison = '(search_rank, lots.id) <= (?, ?)'
+        else:
+            sort_column, order = 'created_at', ' ORDER BY lots.created_at DESC, lots.id DESC'
+            comparison = '(lots.created_at, lots.id) < (?, ?)'
+            last_comparison = '(lots.created_at, lots.id) >= (?, ?)'
+        if cursor:
+            sort_key, lot_id = decode_cursor(cursor)
+            source += f' AND {comparison}'
+            params.extend([sort_key, lot_id])
+        
+        if stream:
+            if last_key is not None:
+                source += f' AND {last_comparison}'
+                params.extend(last_key)
+            return f"SELECT {select}{source}{order}", params, sort_column
+        if keys_only:
+            select = f"{'search_rank' if ranked else 'lots.created_at'} AS sort_key, lots.id"
+            return f"SELECT {select}{source}{order} LIMIT 2 OFFSET ?", params + [limit - 1], sort_column
+        # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+        return f"SELECT {select}{source}{order} LIMIT ?", params + [limit + 1], sort_column
     
-    def save_filters(self, filters: Dict):
-        """Сохранить фильтры"""
+    def get_lots_page(self, filters: Optional[Dict] = None, cursor: Optional[str] = None,
+                      limit: int = config.LOTS_PAGE_SIZE,
+                      columns: Optional[Iterable[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Получить одну страницу лотов (новые сначала) и курсор следующей страницы.
+        
+        Выборка по ключу (created_at, id): страница начинается сразу после лота,
+        на котором закончилась предыдущая, поэтому стоимость не растёт с номером
+        страницы. С поисковым запросом filters['q'] лоты идут по релевантности,
+        ключ — (search_rank, id). columns — список столбцов из LOT_COLUMNS
+        (по умолчанию все); id и created_at возвращаются всегда. Курсор None —
+        страниц больше нет.
+        """
+        limit = max(1, min(int(limit), config.LOTS_MAX_PAGE_SIZE))
+        query, params, sort_column = self._lots_page_query(filters, cursor, limit, columns)
+        
         conn = self.get_connection()
-        cursor = conn.cursor()
+        rows = conn.execute(query, params).fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][sort_column], rows[-1]['id'])
+        return [dict(row) for row in rows], next_cursor
+    
+    def iter_lots_page(self, filters: Optional[Dict] = None, cursor: Optional[str] = None,
+                       limit: int = config.LOTS_PAGE_SIZE,
+                       columns: Optional[Iterable[str]] = None) -> Tuple[Iterator[Dict], Optional[str]]:
+        """То же, что get_lots_page, но лоты читаются из курсора базы по мере выдачи.
         
-        # Удаляем старые фильтры (оставляем только последние)
-        cursor.execute('DELETE FROM filters')
+        Курсор следующей страницы нужен до первой строки (он уходит в заголовке
+        ответа), поэтому его даёт отдельный короткий запрос одних ключей.
+        Сами строки читаются позже и могут увидеть лоты, записанные между
+        запросами, поэтому выборка ограничена не числом строк, а ключом
+        следующего курсора: страница может оказаться длиннее limit, но ни один
+        лот не выпадет между страницами.
+        Некорректные columns/cursor дают ValueError сразу, а не при чтении.
+        """
+        limit = max(1, min(int(limit), config.LOTS_MAX_PAGE_SIZE))
+        keys_query, keys_params, _ = self._lots_page_query(filters, cursor, limit, columns, keys_only=True)
+        
+        conn = self.get_connection()
+        keys = conn.execute(keys_query, keys_params).fetchall()
+        last_key = (keys[0]['sort_key'], keys[0]['id']) if len(keys) == 2 else None
+        next_cursor = encode_cursor(*last_key) if last_key else None
+        query, params, _ = self._lots_page_query(filters, cursor, limit, columns, stream=True, last_key=last_key)
+        
+        def rows() -> Iterator[Dict]:
+            result = conn.execute(query, params)
+            while True:
+                batch = result.fetchmany(200)
+                if not batch:
+                    break
+                for row in batch:
+                    yield dict(row)
+        
+        return rows(), next_cursor
+    
+    def data_version(self) -> int:
+        """Версия данных лотов: растёт при каждой записи в таблицу lots (для ETag)"""
+        conn = self.get_connection()
+        return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+    
+    def count_lots(self, filters: Optional[Dict] = None) -> int:
+        """Количество лотов с опциональными фильтрами (без фильтров — из сводной статистики)"""
+        conn = self.get_connection()
+        if not filters or set(filters) == {'archived'}:
+            row = conn.execute("SELECT lots FROM lot_stats WHERE dimension = 'all' AND key_id = 0").fetchone()
+            return (row[0] if row else 0) + (self.count_archived_lots() if filters else 0)
+        source, params, _ = self._filter_clause(filters)
+        return conn.execute('SELECT COUNT(*)' + source, params).fetchone()[0]
+    
+    def save_filters(self, filters: Dict, name: str = DEFAULT_FILTER_PROFILE):
+        """Сохранить фильтры под именем профиля (профиль с тем же именем заменяется)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        # Сохраняем новые
         cursor.execute('''
             INSERT INTO filters (filter_name, filter_data)
             VALUES (?, ?)
-        ''', ('last_filters', json.dumps(filters, ensure_ascii=False)))
+            ON CONFLICT(filter_name) DO UPDATE SET
+                filter_data = excluded.filter_data,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (name, json.dumps(filters, ensure_ascii=False)))
         
         conn.commit()
-        conn.close()
     
-    def get_filters(self) -> Optional[Dict]:
-        """Получить сохраненные фильтры"""
+    def get_filters(self, name: str = DEFAULT_FILTER_PROFILE) -> Optional[Dict]:
+        """Получить сохраненные фильтры профиля"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT filter_data FROM filters ORDER BY updated_at DESC LIMIT 1')
+        cursor.execute('SELECT filter_data FROM filters WHERE filter_name = ?', (name,))
         row = cursor.fetchone()
-        conn.close()
         
         if row:
             return json.loads(row['filter_data'])
         return None
     
+    def get_filter_profiles(self) -> Dict[str, Dict]:
+        """Получить все профили фильтров: {имя профиля: фильтры}"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT filter_name, filter_data FROM filters ORDER BY filter_name')
+        rows = cursor.fetchall()
+        
+        return {row['filter_name']: json.loads(row['filter_data']) for row in rows}
+    
+    def delete_filters(self, name: str) -> bool:
+        """Удалить профиль фильтров"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM filters WHERE filter_name = ?', (name,))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        return deleted
+    
     def get_status_changes(self, lot_number: str) -> List[Dict]:
         """Получить историю изменений статуса для лота"""
         conn = self.get_connection()
@@ -233,6 +1242,147 @@ class Database:
             ORDER BY changed_at DESC
         ''', (lot_number,))
         rows = cursor.fetchall()
-        conn.close()
         
         return [dict(row) for row in rows]
+    
+    def get_lot_timeline(self, lot_number: str, limit: int = config.LOTS_MAX_PAGE_SIZE) -> List[Dict]:
+        """Хронология изменений полей лота (новые сначала)"""
+        conn = self.get_connection()
+        rows = conn.execute('''
+            SELECT change_fields.name AS field, lot_changes.old_value, lot_changes.new_value,
+                   datetime(lot_changes.changed_at, 'unixepoch') AS changed_at
+            FROM lot_changes
+            JOIN change_fields ON change_fields.id = lot_changes.field_id
+            WHERE lot_changes.lot_id = COALESCE(
+                (SELECT id FROM main.lots WHERE lot_number = ?),
+                (SELECT id FROM history.lots WHERE lot_number = ?)
+            )
+            ORDER BY lot_changes.changed_at DESC, lot_changes.id DESC
+            LIMIT ?
+        ''', (lot_number, lot_number, limit)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def _changes_query(self, since: float, until: Optional[float] = None,
+                       fields: Optional[Iterable[str]] = None, region: Optional[str] = None,
+                       direction: Optional[str] = None, cursor: Optional[str] = None,
+                       limit: int = config.LOTS_PAGE_SIZE) -> Tuple[str, List]:
+        """SQL выборки изменений за период и его параметры"""
+        conn = self.get_connection()
+        query = '''
+            SELECT lot_changes.id, lots.lot_number, lots.title, lots.region, lots.lot_url,
+                   change_fields.name AS field, lot_changes.old_value, lot_changes.new_value,
+                   lot_changes.changed_at AS changed_at_ts,
+                   datetime(lot_changes.changed_at, 'unixepoch') AS changed_at
+            FROM lot_changes
+            JOIN change_fields ON change_fields.id = lot_changes.field_id
+            JOIN lots_view AS lots ON lots.id = lot_changes.lot_id
+            WHERE lot_changes.changed_at >= ?
+        '''
+        params: List = [int(since)]
+        if until is not None:
+            query += ' AND lot_changes.changed_at < ?'
+            params.append(int(until))
+        if direction is not None:
+            # Сравнивать «больше/меньше» можно только цены: строки и даты дд.мм.гггг сравнились бы как текст
+            fields = [field for field in (fields or PRICE_CHANGE_FIELDS) if field in PRICE_CHANGE_FIELDS]
+            query += (" AND typeof(lot_changes.old_value) IN ('integer', 'real')"
+                      " AND typeof(lot_changes.new_value) IN ('integer', 'real')")
+            if not fields:
+                query += ' AND 0'
+        if fields:
+            names = list(fields)
+            placeholders = ','.join('?' * len(names))
+            field_ids = [row[0] for row in conn.execute(
+                f'SELECT id FROM change_fields WHERE name IN ({placeholders})', names
+            )]
+            query += self._id_condition('lot_changes.field_id', field_ids, params)
+        if region:
+            region_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM regions WHERE name LIKE ?', (f"%{region}%",)
+            )]
+            query += self._id_condition('lots.region_id', region_ids, params)
+        if direction == 'down':
+            query += ' AND lot_changes.new_value < lot_changes.old_value'
+        elif direction == 'up':
+            query += ' AND lot_changes.new_value > lot_changes.old_value'
+        if cursor:
+            changed_at, change_id = decode_cursor(cursor)
+            query += ' AND (lot_changes.changed_at, lot_changes.id) < (?, ?)'
+            params.extend([changed_at, change_id])
+        query += ' ORDER BY lot_changes.changed_at DESC, lot_changes.id DESC LIMIT ?'
+        # На одну строку больше, чтобы узнать, есть ли следующая страница
+        params.append(limit + 1)
+        return query, params
+    
+    def get_changes(self, since: float, until: Optional[float] = None,
+                    fields: Optional[Iterable[str]] = None, region: Optional[str] = None,
+                    direction: Optional[str] = None, cursor: Optional[str] = None,
+                    limit: int = config.LOTS_PAGE_SIZE) -> Tuple[List[Dict], Optional[str]]:
+        """Изменения полей лотов за период [since, until) (секунды Unix), новые сначала.
+        
+        fields — имена полей (например current_price), region — подстрока
+        названия региона, direction — 'down'/'up' для снижения/роста цены
+        (только поля PRICE_CHANGE_FIELDS; без fields — обе цены). Возвращает
+        страницу и курсор следующей страницы.
+        """
+        if direction not in (None, 'down', 'up'):
+            raise ValueError(f"Неизвестное направление: {direction}")
+        if direction is not None and fields:
+            not_prices = [field for field in fields if field not in PRICE_CHANGE_FIELDS]
+            if not_prices:
+                raise ValueError(f"direction применим только к ценам ({', '.join(PRICE_CHANGE_FIELDS)}), "
+                                 f"а не к {', '.join(not_prices)}")
+        limit = max(1, min(int(limit), config.LOTS_MAX_PAGE_SIZE))
+        query, params = self._changes_query(since, until, fields, region, direction, cursor, limit)
+        
+        conn = self.get_connection()
+        rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['changed_at_ts'], rows[-1]['id'])
+        for row in rows:
+            del row['changed_at_ts']
+        return rows, next_cursor
+    
+    def get_listing_fingerprints(self, lot_numbers: List[str]) -> Dict[str, Optional[str]]:
+        """Получить отпечатки известных лотов по их номерам"""
+        if not lot_numbers:
+            return {}
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(lot_numbers))
+        # Архивные лоты тоже известны, иначе обход считал бы их новыми
+        cursor.execute(f'''
+            SELECT lot_number, listing_fingerprint FROM main.lots WHERE lot_number IN ({placeholders})
+            UNION ALL
+            SELECT lot_number, listing_fingerprint FROM history.lots WHERE lot_number IN ({placeholders})
+        ''', list(lot_numbers) * 2)
+        rows = cursor.fetchall()
+        
+        return {row['lot_number']: row['listing_fingerprint'] for row in rows}
+    
+    def get_high_water_mark(self, filter_key: str) -> Optional[str]:
+        """Получить номер самого нового лота, увиденного для набора фильтров"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT high_water_mark FROM crawl_state WHERE filter_key = ?', (filter_key,))
+        row = cursor.fetchone()
+        
+        if row:
+            return row['high_water_mark']
+        return None
+    
+    def save_high_water_mark(self, filter_key: str, lot_number: str):
+        """Сохранить номер самого нового лота для набора фильтров"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO crawl_state (filter_key, high_water_mark, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(filter_key) DO UPDATE SET
+                high_water_mark = excluded.high_water_mark,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (filter_key, lot_number))
+        conn.commit()
@@ -117,6 +117,8 @@ rsync -av --exclude='venv' \
          --exclude='*.pyc' \
          --exclude='.git' \
          --exclude='*.db' \
+         --exclude='backups' \
+         --exclude='export_cache' \
          --exclude='*.xlsx' \
          --exclude='test_*.py' \
          --exclude='deploy.sh' \
@@ -192,6 +194,19 @@ server {
         proxy_send_timeout 60s;
         proxy_read_timeout 60s;
     }
+    
+    # Выгрузка всех лотов в Excel собирается дольше обычного запроса
+    location /export {
+        proxy_pass http://127.0.0.1:5000;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        
+        proxy_connect_timeout 60s;
+        proxy_send_timeout 300s;
+        proxy_read_timeout 300s;
+    }
 }
 EOF
 
@@ -263,21 +278,10 @@ if [ "$SETUP_BACKUP" = "y" ] || [ "$SETUP_BACKUP" = "Y" ]; then
     # Создание скрипта бэкапа
     cat > "$APP_DIR/backup.sh" <<'BACKUP_SCRIPT'
 #!/bin/bash
-BACKUP_DIR="/opt/backups/torgi-monitor"
+# Онлайн-копия через SQLite backup API: приложение не останавливается,
+# копии проверяются integrity_check, сжимаются и ротируются (см. BACKUP_* в config.py)
 APP_DIR="/opt/torgi-monitor"
-DATE=$(date +%Y%m%d_%H%M%S)
-
-mkdir -p "$BACKUP_DIR"
-
-if [ -f "$APP_DIR/auctions.db" ]; then
-    cp "$APP_DIR/auctions.db" "$BACKUP_DIR/auctions_$DATE.db"
-    find "$BACKUP_DIR" -name "auctions_*.db" -mtime +7 -exec gzip {} \;
-    find "$BACKUP_DIR" -name "auctions_*.db.gz" -mtime +30 -delete
-    echo "Backup completed: $DATE"
-else
-    echo "Error: Database file not found"
-    exit 1
-fi
+cd "$APP_DIR" && "$APP_DIR/venv/bin/python" manage.py backup
 BACKUP_SCRIPT
 
     chmod +x "$APP_DIR/backup.sh"
@@ -1,39 +1,226 @@
-# Модуль для экспорта данных в Excel
-import pandas as pd
-from datetime import datetime
-from typing import List, Dict
+# Модуль для экспорта данных в Excel, CSV и Parquet
+import csv
+import hashlib
+import json
 import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+import config
+
+# Столбцы выгрузки: заголовок, поле лота, значение по умолчанию
+EXPORT_COLUMNS = (
+    ('Номер лота', 'lot_number', ''),
+    ('Название', 'title', ''),
+    ('Вид торгов', 'lot_type', ''),
+    ('Начальная цена', 'initial_price', None),
+    ('Текущая цена', 'current_price', None),
+    ('Валюта', 'currency', '₽'),
+    ('Регион', 'region', ''),
+    ('Адрес', 'address', ''),
+    ('Дата окончания подачи заявок', 'application_deadline', ''),
+    ('Статус', 'status', ''),
+    ('Организатор', 'organizer', ''),
+    ('Ссылка на лот', 'lot_url', ''),
+    ('Дата создания', 'created_at', ''),
+    ('Дата обновления', 'updated_at', ''),
+)
+
+# Поля с ценами — числа, остальные выгружаются строками
+PRICE_FIELDS = frozenset({'initial_price', 'current_price'})
 
-def export_to_excel(lots: List[Dict], filename: str = None) -> str:
-    """Экспортировать лоты в Excel файл"""
-    if not filename:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"auctions_export_{timestamp}.xlsx"
-    
-    # Подготовка данных для экспорта
-    data = []
+class ExportFormatUnavailable(RuntimeError):
+    """Для формата не установлена нужная библиотека"""
+
+def export_rows(lots: Iterable[Dict]) -> Iterator[List]:
+    """Лоты -> строки значений в порядке EXPORT_COLUMNS"""
     for lot in lots:
-        data.append({
-            'Номер лота': lot.get('lot_number', ''),
-            'Название': lot.get('title', ''),
-            'Вид торгов': lot.get('lot_type', ''),
-            'Начальная цена': lot.get('initial_price', ''),
-            'Текущая цена': lot.get('current_price', ''),
-            'Валюта': lot.get('currency', '₽'),
-            'Регион': lot.get('region', ''),
-            'Адрес': lot.get('address', ''),
-            'Дата окончания подачи заявок': lot.get('application_deadline', ''),
-            'Статус': lot.get('status', ''),
-            'Организатор': lot.get('organizer', ''),
-            'Ссылка на лот': lot.get('lot_url', ''),
-            'Дата создания': lot.get('created_at', ''),
-            'Дата обновления': lot.get('updated_at', '')
-        })
-    
-    # Создание DataFrame
-    df = pd.DataFrame(data)
-    
-    # Экспорт в Excel
-    df.to_excel(filename, index=False, engine='openpyxl')
-    
-    return filename
+        row = []
+        for _, field, default in EXPORT_COLUMNS:
+            value = lot.get(field)
+            row.append(default if value is None else value)
+        yield row
+
+def write_xlsx(lots: Iterable[Dict], path: str):
+    """Excel в режиме write_only: строки сразу уходят в файл, а не копятся в памяти"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Лоты')
+    sheet.append([header for header, _, _ in EXPORT_COLUMNS])
+    for row in export_rows(lots):
+        sheet.append(row)
+    workbook.save(path)
+
+def write_csv(lots: Iterable[Dict], path: str):
+    """CSV для Excel: UTF-8 с BOM и разделитель «;» (так его открывает русская локаль)"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+        writer.writerows(export_rows(lots))
+
+def write_parquet(lots: Iterable[Dict], path: str, batch_rows: int = config.EXPORT_BATCH_ROWS):
+    """Parquet (нужен pyarrow): лоты пишутся группами строк по batch_rows"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportFormatUnavailable("Для выгрузки в Parquet установите pyarrow: pip install pyarrow") from e
+
+    schema = pa.schema([
+        (field, pa.float64() if field in PRICE_FIELDS else pa.string())
+        for _, field, _ in EXPORT_COLUMNS
+    ])
+
+    def write_batch(writer, batch: List[List]):
+        arrays = []
+        for field, values in zip(schema, zip(*batch)):
+            if field.type == pa.string():
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(pa.array(values, type=field.type))
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        batch = []
+        for row in export_rows(lots):
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                write_batch(writer, batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
+
+# Форматы выгрузки: формат -> (функция записи, расширение, MIME-тип)
+EXPORT_FORMATS = {
+    'xlsx': (write_xlsx, 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': (write_csv, 'csv', 'text/csv'),
+    'parquet': (write_parquet, 'parquet', 'application/vnd.apache.parquet'),
+}
+
+def export_lots(lots: Iterable[Dict], fmt: str = 'xlsx', directory: Optional[str] = config.EXPORT_TMP_DIR) -> str:
+    """Записать лоты во временный файл формата fmt и вернуть его путь.
+
+    lots читаются по одному (например, из курсора базы), поэтому память не
+    растёт с числом лотов. Удалить файл после отправки — забота вызывающего;
+    при ошибке недописанный файл удаляется здесь.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    writer, extension, _ = EXPORT_FORMATS[fmt]
+    fd, path = tempfile.mkstemp(prefix='auctions_export_', suffix=f'.{extension}', dir=directory)
+    os.close(fd)
+    try:
+        writer(lots, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def export_filename(fmt: str = 'xlsx') -> str:
+    """Имя файла выгрузки для пользователя"""
+    return f"auctions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[fmt][1]}"
+
+class ExportCache:
+    """Готовые выгрузки на диске для повторных запросов.
+
+    Файл ищется по фильтрам, формату и версии данных (Database.data_version()):
+    любая запись в таблицу лотов меняет версию, и прежние файлы больше не
+    подходят — они удаляются при следующем сохранении. Время последнего
+    запроса файла хранится в atime, время создания — в mtime: файлы старше
+    max_age_seconds удаляются, а при превышении max_bytes удаляются давно
+    не запрошенные (LRU).
+    """
+
+    # Имя файла кэша: v<версия данных>_<хэш фильтров и формата>.<расширение>
+    FILE_PATTERN = re.compile(r'^v(\d+)_[0-9a-f]{20}\.\w+$')
+
+    def __init__(self, directory: str = config.EXPORT_CACHE_DIR,
+                 max_bytes: int = config.EXPORT_CACHE_MAX_MB * 1024 * 1024,
+                 max_age_seconds: float = config.EXPORT_CACHE_MAX_AGE_HOURS * 3600):
+        # Абсолютный путь: Flask send_file считает относительные пути от каталога приложения
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+    def path_for(self, filters: Dict, fmt: str, data_version: int) -> str:
+        """Путь к файлу кэша для фильтров, формата и версии данных"""
+        key = json.dumps({'filters': filters, 'format': fmt}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.directory, f"v{data_version}_{digest}.{EXPORT_FORMATS[fmt][1]}")
+
+    def get(self, filters: Dict, fmt: str, data_version: int) -> Optional[str]:
+        """Путь к готовой выгрузке или None, если её нет или она устарела"""
+        path = self.path_for(filters, fmt, data_version)
+        try:
+            created = os.stat(path).st_mtime
+            now = time.time()
+            if now - created > self.max_age_seconds:
+                os.remove(path)
+                return None
+            # Отметка использования для LRU; время создания не меняется
+            os.utime(path, (now, created))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, filters: Dict, fmt: str, data_version: int, lots: Iterable[Dict]) -> str:
+        """Записать выгрузку в кэш и вернуть путь к ней"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(filters, fmt, data_version)
+        # Пишем во временный файл рядом: параллельный запрос не увидит недописанную выгрузку
+        os.replace(export_lots(lots, fmt, self.directory), path)
+        self.evict(data_version, keep=os.path.basename(path))
+        return path
+
+    def evict(self, data_version: Optional[int] = None, keep: Optional[str] = None) -> List[str]:
+        """Удалить устаревшие файлы и уложить кэш в max_bytes, вернуть удалённые имена.
+
+        Файлы версий данных меньше data_version удаляются сразу; файл keep
+        (только что записанный) не удаляется, даже если один не влезает в max_bytes.
+        """
+        removed = []
+        now = time.time()
+        with self._lock:
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                return removed
+            entries = []
+            for name in names:
+                match = self.FILE_PATTERN.match(name)
+                is_leftover = name.startswith('auctions_export_')
+                if not match and not is_leftover:
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                    # Старый файл (в том числе недописанный от упавшей выгрузки) или прежняя версия данных
+                    outdated = (
+                        now - stat.st_mtime > self.max_age_seconds
+                        or (match and data_version is not None and int(match.group(1)) < data_version)
+                    )
+                    if outdated:
+                        os.remove(path)
+                        removed.append(name)
+                    elif match:
+                        entries.append((stat.st_atime, stat.st_size, name))
+                except FileNotFoundError:
+                    continue
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.append(name)
+        return removed
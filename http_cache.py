@@ -0,0 +1,179 @@
+# Модуль дискового кэша HTTP-ответов с условной ревалидацией
+import sqlite3
+import json
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Callable
+import config
+
+class ResponseCache:
+    """Кэш результатов разбора страниц, ключ — URL.
+
+    Для каждого URL хранятся ETag/Last-Modified, хэш тела ответа и
+    уже разобранный результат. Это позволяет отправлять условные запросы
+    (If-None-Match/If-Modified-Since) и не разбирать страницу повторно,
+    если её содержимое не изменилось.
+
+    Вместе с результатом хранится версия разборщика (extractor_version):
+    запись, разобранная другой версией, считается промахом, и страница
+    скачивается и разбирается заново.
+    """
+
+    def __init__(self, db_path: str = config.HTTP_CACHE_PATH,
+                 ttl_hours: float = config.HTTP_CACHE_TTL_HOURS,
+                 max_bytes: int = config.HTTP_CACHE_MAX_BYTES,
+                 extractor_version: int = 0):
+        self.db_path = db_path
+        self.extractor_version = extractor_version
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                parsed TEXT NOT NULL,
+                body_size INTEGER NOT NULL,
+                entry_size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                extractor_version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(responses)')}
+        if 'extractor_version' not in columns:
+            # Записи старого кэша получают версию 0 и будут разобраны заново
+            self._conn.execute('ALTER TABLE responses ADD COLUMN extractor_version INTEGER NOT NULL DEFAULT 0')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)')
+        self._conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Обнулить счётчики (вызывается в начале каждой проверки)"""
+        with self._lock:
+            self._stats = {
+                'requests': 0,
+                'misses': 0,
+                'not_modified': 0,      # сервер ответил 304
+                'unchanged_body': 0,    # 200, но хэш тела совпал
+                'bytes_saved': 0,       # байт, которые не пришлось скачать
+                'parses_skipped': 0,    # разборов HTML, которые удалось пропустить
+            }
+
+    def stats(self) -> Dict:
+        """Счётчики попаданий/промахов с момента последнего reset_stats()"""
+        with self._lock:
+            result = dict(self._stats)
+        result['hits'] = result['not_modified'] + result['unchanged_body']
+        return result
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Получить запись кэша (или None, если её нет, истёк TTL или сменилась версия разборщика)"""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM responses WHERE url = ?', (url,)).fetchone()
+        if not row:
+            return None
+        if time.time() - row['stored_at'] > self.ttl_seconds:
+            return None
+        if row['extractor_version'] != self.extractor_version:
+            return None
+        return dict(row)
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str],
+            content_hash: str, parsed: Dict, body_size: int):
+        """Сохранить (или обновить) запись кэша"""
+        parsed_json = json.dumps(parsed, ensure_ascii=False)
+        now = time.time()
+        entry_size = len(url) + len(parsed_json) + len(etag or '') + len(last_modified or '') + len(content_hash)
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO responses (
+                    url, etag, last_modified, content_hash, parsed,
+                    body_size, entry_size, stored_at, accessed_at, extractor_version
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (url, etag, last_modified, content_hash, parsed_json,
+                  body_size, entry_size, now, now, self.extractor_version))
+            self._conn.commit()
+
+    def touch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Отметить запись как подтверждённую сервером (продлевает TTL)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                UPDATE responses SET
+                    etag = COALESCE(?, etag),
+                    last_modified = COALESCE(?, last_modified),
+                    stored_at = ?,
+                    accessed_at = ?
+                WHERE url = ?
+            ''', (etag, last_modified, now, now, url))
+            self._conn.commit()
+
+    def evict(self):
+        """Удалить устаревшие записи и самые давно использованные сверх лимита размера"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('DELETE FROM responses WHERE stored_at < ?', (time.time() - self.ttl_seconds,))
+
+            total = cursor.execute('SELECT COALESCE(SUM(entry_size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                # Удаляем самые давно использованные записи, пока не уложимся в лимит
+                excess = total - self.max_bytes
+                freed = 0
+                stale = []
+                for row in cursor.execute('SELECT url, entry_size FROM responses ORDER BY accessed_at'):
+                    stale.append((row['url'],))
+                    freed += row['entry_size']
+                    if freed >= excess:
+                        break
+                cursor.executemany('DELETE FROM responses WHERE url = ?', stale)
+            self._conn.commit()
+
+    def fetch(self, session, url: str, parse: Callable[[bytes], Dict], timeout: int = 30) -> Dict:
+        """Загрузить URL через session с условной ревалидацией.
+
+        parse вызывается только если тело ответа изменилось с прошлого раза.
+        """
+        self._count(requests=1)
+        entry = self.get(url)
+
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = session.get(url, headers=headers, timeout=timeout)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        if response.status_code == 304 and entry:
+            self._count(not_modified=1, bytes_saved=entry['body_size'], parses_skipped=1)
+            self.touch(url, etag, last_modified)
+            return json.loads(entry['parsed'])
+
+        response.raise_for_status()
+        content = response.content
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        if entry and entry['content_hash'] == content_hash:
+            # Сервер не поддерживает условные запросы, но страница не изменилась
+            self._count(unchanged_body=1, parses_skipped=1)
+            self.touch(url, etag, last_modified)
+            return json.loads(entry['parsed'])
+
+        self._count(misses=1)
+        parsed = parse(content)
+        self.put(url, etag, last_modified, content_hash, parsed, len(content))
+        return parsed
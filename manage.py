@@ -0,0 +1,108 @@
+# Служебные команды приложения
+#
+#   python manage.py replay [--workers N] [--since-days D]   # пересобрать лоты из архива ответов
+#   python manage.py prune-archive                           # применить срок хранения архива
+#   python manage.py archive-lots [--older-than-days D]       # перенести завершённые лоты в архивную базу
+#   python manage.py backup                                  # резервная копия базы (без остановки приложения)
+#   python manage.py backup-status                           # когда и какой снята последняя копия
+#   python manage.py reconcile-stats                         # пересчитать сводную статистику с нуля
+import argparse
+import logging
+import time
+import config
+import database
+import archive
+import backup
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+def cmd_replay(args):
+    """Пересобрать таблицу lots из архива текущей версией парсера (без сети)"""
+    since = time.time() - args.since_days * 86400 if args.since_days else None
+    summary = archive.replay(database.Database(), archive.ResponseArchive(), workers=args.workers, since=since)
+    print(f"Ответов разобрано: {summary['responses']}, лотов сохранено: {summary['lots']} "
+          f"(новых {summary['new_lots']}, изменённых {summary['changed_lots']}, "
+          f"без изменений {summary['unchanged_lots']}) за {summary['seconds']} с")
+    if summary['missing_objects']:
+        print(f"Пропущено ответов без файла в архиве: {summary['missing_objects']}")
+    if summary['details_missing']:
+        print(f"Лотов без страницы деталей в архиве (детали взяты из базы): {summary['details_missing']}")
+
+def cmd_prune_archive(args):
+    """Удалить из архива ответы старше ARCHIVE_RETENTION_DAYS"""
+    result = archive.ResponseArchive().apply_retention()
+    print(f"Удалено записей: {result['entries']}, объектов: {result['objects']}, байт: {result['bytes']}")
+
+def cmd_archive_lots(args):
+    """Перенести завершённые лоты в архивную базу и вернуть освободившееся место"""
+    result = database.Database().archive_finished_lots(older_than_days=args.older_than_days)
+    print(f"Перенесено в архив лотов: {result['archived']}, освобождено страниц: {result['freed_pages']}")
+
+def cmd_backup(args):
+    """Снять резервную копию базы и архива завершённых лотов"""
+    try:
+        report = backup.BackupManager().run()
+    except backup.BackupBusy as e:
+        print(e)
+        raise SystemExit(1)
+    print_backup(report)
+    if not report['success']:
+        raise SystemExit(1)
+
+def cmd_backup_status(args):
+    """Показать сведения о последней резервной копии"""
+    report = backup.last_backup()
+    if report is None:
+        print("Резервных копий ещё не было")
+        raise SystemExit(1)
+    print_backup(report)
+
+def cmd_reconcile_stats(args):
+    """Пересчитать сводную статистику lot_stats по таблицам лотов"""
+    result = database.Database().reconcile_stats()
+    print(f"Строк статистики: {result['rows']}, исправлено: {len(result['corrected'])}")
+    for dimension, key_id in result['corrected']:
+        print(f"  {dimension} {key_id}")
+
+def print_backup(report):
+    state = 'успешно' if report['success'] else f"ошибка: {report['error']}"
+    print(f"Копия от {report['started_at']}: {state}, {report['duration_seconds']} с, "
+          f"{report['total_bytes']} байт")
+    for item in report['files']:
+        print(f"  {item['file']}: {item['bytes']} байт (база {item['source_bytes']} байт), "
+              f"integrity_check: {item['integrity']}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Служебные команды мониторинга torgi.gov.ru')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = subparsers.add_parser('replay', help='Пересобрать лоты из архива ответов')
+    replay_parser.add_argument('--workers', type=int, default=config.REPLAY_WORKERS, help='Число процессов разбора')
+    replay_parser.add_argument('--since-days', type=float, help='Только ответы за последние N дней')
+    replay_parser.set_defaults(func=cmd_replay)
+
+    prune_parser = subparsers.add_parser('prune-archive', help='Применить срок хранения архива')
+    prune_parser.set_defaults(func=cmd_prune_archive)
+
+    archive_lots_parser = subparsers.add_parser('archive-lots', help='Перенести завершённые лоты в архивную базу')
+    archive_lots_parser.add_argument('--older-than-days', type=float, default=config.LOTS_ARCHIVE_AFTER_DAYS,
+                                     help='Переносить лоты, не менявшиеся дольше N дней')
+    archive_lots_parser.set_defaults(func=cmd_archive_lots)
+
+    backup_parser = subparsers.add_parser('backup', help='Резервная копия базы без остановки приложения')
+    backup_parser.set_defaults(func=cmd_backup)
+
+    backup_status_parser = subparsers.add_parser('backup-status', help='Сведения о последней резервной копии')
+    backup_status_parser.set_defaults(func=cmd_backup_status)
+
+    reconcile_parser = subparsers.add_parser('reconcile-stats', help='Пересчитать сводную статистику с нуля')
+    reconcile_parser.set_defaults(func=cmd_reconcile_stats)
+
+    args = arg_parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
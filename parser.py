@@ -1,20 +1,218 @@
 # Модуль для парсинга сайта torgi.gov.ru
-import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from lxml import etree, html as lxml_html
 import re
+import os
 import json
-from typing import List, Dict, Optional
-from urllib.parse import urlencode, urljoin
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable, Tuple
+from urllib.parse import urlencode, urljoin, urlparse
 import time
 import config
+from http_cache import ResponseCache
+from browser_pool import BrowserPool
+from ratelimit import ThrottledSession, CircuitOpenError
+from archive import ResponseArchive, KIND_API, KIND_LISTING, KIND_DETAIL
+
+logger = logging.getLogger(__name__)
+
+# Версия разбора страницы лота (extract_lot_details): увеличивать при любом
+# изменении извлекаемых полей, иначе кэш страниц будет отдавать старый разбор
+EXTRACTOR_VERSION = 2
+
+# Стратегии получения списка лотов, от самой быстрой к самой медленной
+FETCH_STRATEGIES = ('api', 'table', 'cards', 'script_json', 'selenium')
+# Ответы API, которыми отклоняется сам запрос (размер страницы не принят);
+# на остальные ошибки (429, 5xx) меньший размер страницы не поможет
+API_REJECTED_STATUSES = frozenset({400, 413, 422})
+
+# Ключевые слова для распознавания полей в тексте ячеек/блоков (в нижнем регистре)
+REGION_KEYWORDS = ('край', 'область', 'республика', 'округ')
+DETAIL_REGION_KEYWORDS = ('край', 'область', 'республика')
+STATUS_KEYWORDS = ('прием', 'заявок', 'публикация', 'закрыт', 'отменен', 'проведен')
+
+# Регулярные выражения компилируются один раз, а не в цикле по ячейкам
+_REGION_RE = re.compile('|'.join(REGION_KEYWORDS))
+_DETAIL_REGION_RE = re.compile('|'.join(DETAIL_REGION_KEYWORDS))
+_STATUS_RE = re.compile('|'.join(STATUS_KEYWORDS))
+_DATE_RE = re.compile(r'\d{2}\.\d{2}\.\d{4}')
+_NUMBER_RE = re.compile(r'(\d+)')
+_PRICE_JUNK_RE = re.compile(r'[^\d,.]')
+_CARD_CLASS_RE = re.compile(r'lot|card|item|row', re.I)
+_INFO_CLASS_RE = re.compile(r'info|data|field|value')
+
+_CARD_TAGS = frozenset({'div', 'article', 'li'})
+_CARD_TEXT_TAGS = frozenset({'span', 'div', 'p', 'td'})
+_INFO_TAGS = frozenset({'div', 'span', 'p'})
+# Содержимое этих тегов не считается текстом страницы
+_NON_TEXT_TAGS = frozenset({'script', 'style', 'template'})
+
+def _parse_html(content: bytes):
+    """Разобрать HTML в дерево lxml (None, если документ пустой)"""
+    try:
+        try:
+            return lxml_html.document_fromstring(content.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            # Не UTF-8 (или есть XML-декларация) — кодировку определит lxml по meta
+            return lxml_html.document_fromstring(content)
+    except etree.ParserError:
+        return None
+
+def _element_texts(root, match: Callable, include_root: bool = False) -> List:
+    """Тексты элементов поддерева, для которых match(el) истинно.
+    
+    Дерево обходится один раз: каждый текстовый узел очищается от пробелов
+    единожды, а текст элемента собирается из уже очищенных кусков (как
+    get_text(strip=True) в BeautifulSoup). Возвращает пары (элемент, текст)
+    в порядке документа.
+    """
+    pieces: List[str] = []
+    result: List = []
+    open_elements: List = []  # (индекс в result, с какого куска начинается текст)
+    depth = 0
+    
+    for event, el in etree.iterwalk(root, events=('start', 'end')):
+        tag = el.tag
+        is_element = isinstance(tag, str)
+        if event == 'start':
+            depth += 1
+            if is_element:
+                if (include_root or depth > 1) and match(el):
+                    open_elements.append((len(result), len(pieces)))
+                    result.append([el, ''])
+                if el.text and tag not in _NON_TEXT_TAGS:
+                    text = el.text.strip()
+                    if text:
+                        pieces.append(text)
+        else:
+            depth -= 1
+            if open_elements and result[open_elements[-1][0]][0] is el:
+                index, start = open_elements.pop()
+                result[index][1] = ''.join(pieces[start:])
+            # Хвост корня к его тексту не относится
+            if depth > 0 and el.tail:
+                text = el.tail.strip()
+                if text:
+                    pieces.append(text)
+    
+    return result
+
+def _first_link(root):
+    """Первая ссылка с атрибутом href внутри элемента"""
+    for link in root.iter('a'):
+        if link.get('href') is not None:
+            return link
+    return None
+
+def _link_text(link) -> str:
+    texts = _element_texts(link, lambda el: True, include_root=True)
+    return texts[0][1] if texts else ''
+
+def filters_key(filters: Dict) -> str:
+    """Стабильный ключ набора фильтров (не зависит от порядка полей)"""
+    normalized = {k: v for k, v in (filters or {}).items() if v not in (None, '')}
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+class StrategyMemory:
+    """Запоминает, какая стратегия получения лотов сработала для набора фильтров.
+    
+    Состояние хранится в JSON файле, чтобы переживать перезапуски. Более быстрые
+    стратегии перепроверяются по расписанию (reprobe_hours) или после сбоя
+    запомненной стратегии.
+    """
+    
+    def __init__(self, path: str = config.STRATEGY_STATE_PATH,
+                 reprobe_hours: float = config.STRATEGY_REPROBE_HOURS):
+        self.path = path
+        self.reprobe_seconds = reprobe_hours * 3600
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict] = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            self._state = {}
+    
+    def order(self, key: str) -> List[str]:
+        """Порядок перебора стратегий для набора фильтров"""
+        with self._lock:
+            entry = self._state.get(key)
+        if not entry or entry.get('failed') or entry.get('strategy') not in FETCH_STRATEGIES:
+            return list(FETCH_STRATEGIES)
+        if time.time() - entry.get('probed_at', 0) > self.reprobe_seconds:
+            # Пора проверить, не заработали ли более быстрые стратегии
+            return list(FETCH_STRATEGIES)
+        strategy = entry['strategy']
+        return [strategy] + [name for name in FETCH_STRATEGIES if name != strategy]
+    
+    def record_success(self, key: str, strategy: str):
+        with self._lock:
+            entry = self._state.get(key, {})
+            # Время пробы обновляется, только если перед этим были перебраны все более быстрые стратегии
+            probed = (entry.get('strategy') != strategy or entry.get('failed')
+                      or time.time() - entry.get('probed_at', 0) > self.reprobe_seconds)
+            if not probed:
+                return
+            self._state[key] = {
+                'strategy': strategy,
+                'probed_at': time.time(),
+                'failed': False,
+            }
+        self._save()
+    
+    def record_failure(self, key: str, strategy: str):
+        with self._lock:
+            entry = self._state.get(key)
+            if not entry or entry.get('strategy') != strategy or entry.get('failed'):
+                return
+            entry['failed'] = True
+        self._save()
+    
+    def _save(self):
+        with self._lock:
+            payload = json.dumps(self._state, ensure_ascii=False, indent=2)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить состояние стратегий: {e}")
 
 class TorgiParser:
-    def __init__(self):
+    def __init__(self, offline: bool = False):
+        """offline=True — только разбор уже загруженных страниц (переразбор архива):
+        без кэша, архива и памяти стратегий на диске"""
         self.base_url = config.TORGI_BASE_URL
-        self.session = requests.Session()
+        # Все запросы к сайту проходят через общий адаптивный лимитер и размыкатель
+        self.session = ThrottledSession()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+        # Пул соединений должен вмещать все потоки загрузки деталей,
+        # иначе лишние соединения будут открываться и закрываться заново
+        adapter = HTTPAdapter(pool_maxsize=max(config.DETAIL_FETCH_WORKERS, 10))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_limits_lock = threading.Lock()
+        # Размер страницы API, подобранный при первом запросе
+        self.api_page_size: Optional[int] = None
+        # Пул браузеров создаётся при первом обращении к Selenium
+        self.browser_pool: Optional[BrowserPool] = None
+        if offline:
+            self.cache = None
+            self.strategy_memory = None
+            self.archive = None
+            return
+        # Кэш страниц лотов с условной ревалидацией (ETag/Last-Modified)
+        self.cache = ResponseCache(extractor_version=EXTRACTOR_VERSION)
+        # Какая стратегия получения лотов сработала в прошлый раз
+        self.strategy_memory = StrategyMemory()
+        # Архив сырых ответов для офлайн-переразбора
+        self.archive = ResponseArchive() if config.ARCHIVE_ENABLED else None
     
     def parse_price(self, price_text: str) -> Optional[float]:
         """Парсинг цены из текста"""
@@ -22,7 +220,7 @@ class TorgiParser:
             return None
         
         # Удаляем все символы кроме цифр, точек и запятых
-        price_clean = re.sub(r'[^\d,.]', '', price_text.replace(' ', ''))
+        price_clean = _PRICE_JUNK_RE.sub('', price_text.replace(' ', ''))
         price_clean = price_clean.replace(',', '.')
         
         try:
@@ -31,28 +229,26 @@ class TorgiParser:
             return None
     
     def parse_lot_from_row(self, row) -> Optional[Dict]:
-        """Парсинг данных одного лота из строки таблицы"""
+        """Парсинг данных одного лота из строки таблицы (элемент lxml <tr>)"""
         try:
-            cells = row.find_all('td')
+            cells = _element_texts(row, lambda el: el.tag == 'td')
             if len(cells) < 5:
                 return None
             
             # Извлекаем ссылку на лот
-            link_elem = row.find('a', href=True)
+            link_elem = _first_link(row)
             lot_url = ''
             lot_number = ''
+            title = ''
             
-            if link_elem:
-                lot_url = urljoin(self.base_url, link_elem['href'])
+            if link_elem is not None:
+                lot_url = urljoin(self.base_url, link_elem.get('href'))
                 # Извлекаем номер лота из URL или текста
-                lot_number_match = re.search(r'(\d+)', lot_url)
+                lot_number_match = _NUMBER_RE.search(lot_url)
                 if lot_number_match:
                     lot_number = lot_number_match.group(1)
-            
-            # Название лота
-            title = ''
-            if link_elem:
-                title = link_elem.get_text(strip=True)
+                # Название лота
+                title = _link_text(link_elem)
             
             # Парсим остальные данные из ячеек
             lot_data = {
@@ -71,16 +267,15 @@ class TorgiParser:
             }
             
             # Пытаемся извлечь данные из ячеек
-            for i, cell in enumerate(cells):
-                text = cell.get_text(strip=True)
+            for i, (_, text) in enumerate(cells):
+                low = text.lower()
                 
                 # Регион обычно в одной из первых ячеек
-                if i < 3 and not lot_data['region']:
-                    if any(keyword in text.lower() for keyword in ['край', 'область', 'республика', 'округ']):
-                        lot_data['region'] = text
+                if i < 3 and not lot_data['region'] and _REGION_RE.search(low):
+                    lot_data['region'] = text
                 
                 # Цены
-                if '₽' in text or 'руб' in text.lower():
+                if '₽' in text or 'руб' in low:
                     price = self.parse_price(text)
                     if price and not lot_data['initial_price']:
                         lot_data['initial_price'] = price
@@ -88,13 +283,13 @@ class TorgiParser:
                         lot_data['current_price'] = price
                 
                 # Даты
-                date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', text)
-                if date_match and not lot_data['application_deadline']:
-                    lot_data['application_deadline'] = date_match.group(0)
+                if not lot_data['application_deadline']:
+                    date_match = _DATE_RE.search(text)
+                    if date_match:
+                        lot_data['application_deadline'] = date_match.group(0)
                 
                 # Статус
-                status_keywords = ['прием', 'заявок', 'публикация', 'закрыт', 'отменен', 'проведен']
-                if any(keyword in text.lower() for keyword in status_keywords):
+                if _STATUS_RE.search(low):
                     lot_data['status'] = text
             
             return lot_data
@@ -103,176 +298,400 @@ class TorgiParser:
             print(f"Ошибка при парсинге лота: {e}")
             return None
     
+    def listing_url(self, filters: Dict, page: int = 1) -> str:
+        """URL страницы реестра лотов с фильтрами (для HTML и SPA)"""
+        params = {}
+        
+        if filters.get('region'):
+            params['region'] = filters['region']
+        if filters.get('status'):
+            params['status'] = filters['status']
+        if filters.get('lot_type'):
+            params['lot_type'] = filters['lot_type']
+        if filters.get('organizer'):
+            params['organizer'] = filters['organizer']
+        
+        if page > 1:
+            params['page'] = page
+        
+        url = self.base_url
+        if params:
+            url += '?' + urlencode(params)
+        return url
+    
     def get_lots_from_page(self, filters: Dict, page: int = 1) -> List[Dict]:
-        """Получить лоты со страницы с применением фильтров"""
-        lots = []
+        """Получить лоты со страницы с применением фильтров
         
-        try:
-            # Пытаемся найти API endpoint для получения данных
-            # Многие современные сайты используют API для загрузки данных
-            api_url = "https://torgi.gov.ru/new/api/public/lots/search"
-            
-            # Формируем параметры запроса для API
-            api_params = {
-                'page': page,
-                'size': 20
-            }
-            
-            # Добавляем фильтры
-            if filters.get('region'):
-                api_params['region'] = filters['region']
-            if filters.get('status'):
-                api_params['status'] = filters['status']
-            if filters.get('lot_type'):
-                api_params['lotType'] = filters['lot_type']
-            if filters.get('organizer'):
-                api_params['organizer'] = filters['organizer']
-            if filters.get('min_price'):
-                api_params['minPrice'] = filters['min_price']
-            if filters.get('max_price'):
-                api_params['maxPrice'] = filters['max_price']
-            
-            # Пытаемся получить данные через API
+        Стратегии получения данных (API, таблица, карточки, JSON в HTML, Selenium)
+        перебираются начиная с той, что сработала в прошлый раз для этих фильтров.
+        """
+        lots, _ = self._fetch_page(filters, page)
+        return lots
+    
+    def _fetch_page(self, filters: Dict, page: int) -> Tuple[List[Dict], Optional[int]]:
+        """Лоты страницы и общее число страниц (если источник его сообщает)"""
+        key = filters_key(filters)
+        # Общий контекст стратегий: HTML страницы загружается один раз на все
+        # HTML-стратегии, API записывает сюда общее число страниц
+        context: Dict = {}
+        
+        for name in self.strategy_memory.order(key):
+            started = time.monotonic()
             try:
-                response = self.session.get(api_url, params=api_params, timeout=30)
-                if response.status_code == 200:
-                    data = response.json()
-                    if isinstance(data, dict) and 'content' in data:
-                        # Обрабатываем данные из API
-                        for item in data.get('content', []):
-                            lot_data = self.parse_lot_from_api(item)
-                            if lot_data:
-                                lots.append(lot_data)
-                        return lots
-            except:
-                pass  # Если API не работает, переходим к парсингу HTML
-            
-            # Если API не работает, парсим HTML
-            # Формируем параметры запроса для HTML
-            params = {}
-            
-            if filters.get('region'):
-                params['region'] = filters['region']
-            if filters.get('status'):
-                params['status'] = filters['status']
-            if filters.get('lot_type'):
-                params['lot_type'] = filters['lot_type']
-            if filters.get('organizer'):
-                params['organizer'] = filters['organizer']
-            
-            if page > 1:
-                params['page'] = page
+                lots = self._run_strategy(name, filters, page, context)
+            except CircuitOpenError as e:
+                # Сайт недоступен — остальные стратегии тоже не помогут
+                print(f"Ошибка при получении лотов: {e}")
+                return [], None
+            except Exception as e:
+                logger.debug(f"Стратегия {name} завершилась ошибкой: {e}")
+                lots = None
+            elapsed = time.monotonic() - started
             
-            # Делаем запрос
-            url = self.base_url
-            if params:
-                url += '?' + urlencode(params)
+            if lots is not None:
+                logger.info(f"Стратегия {name}: {elapsed:.2f} с, лотов: {len(lots)} (страница {page})")
+                self.strategy_memory.record_success(key, name)
+                return lots, context.get('total_pages')
             
+            logger.info(f"Стратегия {name}: {elapsed:.2f} с, данные не найдены (страница {page})")
+            self.strategy_memory.record_failure(key, name)
+        
+        print("Не удалось получить лоты ни одной из стратегий")
+        return [], None
+    
+    def _run_strategy(self, name: str, filters: Dict, page: int, context: Dict) -> Optional[List[Dict]]:
+        """Выполнить одну стратегию. None — стратегия не подошла для этой страницы"""
+        if name == 'api':
+            return self._lots_via_api(filters, page, context)
+        if name == 'selenium':
+            lots = self.get_lots_via_selenium(filters=filters, page=page)
+            return lots or None
+        
+        if 'root' not in context:
+            context['root'] = None
+            url = self.listing_url(filters, page)
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
+            self._archive(KIND_LISTING, url, response.content, filters, page)
+            context['root'] = _parse_html(response.content)
+        root = context['root']
+        if root is None:
+            # Загрузка HTML не удалась или документ пустой
+            return None
+        
+        if name == 'table':
+            return self._lots_from_table(root)
+        if name == 'cards':
+            return self._lots_from_cards(root)
+        if name == 'script_json':
+            return self._lots_from_script_json(root)
+        raise ValueError(f"Неизвестная стратегия: {name}")
+    
+    def _lots_via_api(self, filters: Dict, page: int, context: Dict) -> Optional[List[Dict]]:
+        """Получить лоты через JSON API
+        
+        Размер страницы подбирается при первом обращении: пробуются значения из
+        config.API_PAGE_SIZES по убыванию, пока API не примет запрос. Меньший
+        размер пробуется только если API отклонил запрос (400/413/422); при
+        429 и ошибках сервера выбрасывается requests.HTTPError.
+        """
+        api_url = "https://torgi.gov.ru/new/api/public/lots/search"
+        
+        # Формируем параметры запроса для API
+        api_params = {
+            'page': page
+        }
+        
+        # Добавляем фильтры
+        if filters.get('region'):
+            api_params['region'] = filters['region']
+        if filters.get('status'):
+            api_params['status'] = filters['status']
+        if filters.get('lot_type'):
+            api_params['lotType'] = filters['lot_type']
+        if filters.get('organizer'):
+            api_params['organizer'] = filters['organizer']
+        if filters.get('min_price'):
+            api_params['minPrice'] = filters['min_price']
+        if filters.get('max_price'):
+            api_params['maxPrice'] = filters['max_price']
+        
+        sizes = [self.api_page_size] if self.api_page_size else list(config.API_PAGE_SIZES)
+        for size in sizes:
+            api_params['size'] = size
+            response = self.session.get(api_url, params=api_params, timeout=30)
+            if response.status_code in API_REJECTED_STATUSES:
+                # Такой размер страницы не принят — пробуем меньший
+                continue
+            # Перегрузка или сбой сервера: ошибку обработает перебор стратегий,
+            # запомненный размер страницы остаётся
+            response.raise_for_status()
+            data = response.json()
+            if not (isinstance(data, dict) and 'content' in data):
+                return None
+            self._archive(KIND_API, getattr(response, 'url', api_url), response.content, filters, page)
             
-            soup = BeautifulSoup(response.content, 'lxml')
+            # API может молча урезать размер страницы — запоминаем тот, что применился
+            effective_size = data.get('size') if isinstance(data.get('size'), int) and data.get('size') > 0 else size
+            if self.api_page_size != effective_size:
+                logger.info(f"Размер страницы API: {effective_size}")
+                self.api_page_size = effective_size
             
-            # Ищем различные структуры данных
-            # 1. Таблица
-            table = soup.find('table')
-            if table:
-                rows = table.find_all('tr')[1:]  # Пропускаем заголовок
-                for row in rows:
-                    lot_data = self.parse_lot_from_row(row)
-                    if lot_data:
-                        lots.append(lot_data)
-                return lots
+            total_pages = data.get('totalPages')
+            if not isinstance(total_pages, int) and isinstance(data.get('totalElements'), int):
+                total_pages = -(-data['totalElements'] // effective_size)
+            if isinstance(total_pages, int):
+                context['total_pages'] = total_pages
             
-            # 2. Список карточек/блоков
-            cards = soup.find_all(['div', 'article', 'li'], class_=re.compile(r'lot|card|item|row', re.I))
-            if cards:
-                for card in cards:
-                    lot_data = self.parse_lot_from_card(card)
-                    if lot_data:
-                        lots.append(lot_data)
+            return self._lots_from_api_data(data)
+        
+        # Ни один размер не принят — в следующий раз подберём заново
+        self.api_page_size = None
+        return None
+    
+    def _lots_from_api_data(self, data: Dict) -> List[Dict]:
+        """Лоты из разобранного ответа API поиска"""
+        lots = []
+        for item in data.get('content', []):
+            lot_data = self.parse_lot_from_api(item)
+            if lot_data:
+                lots.append(lot_data)
+        return lots
+    
+    def parse_api_payload(self, content: bytes) -> Optional[List[Dict]]:
+        """Лоты из сырого ответа API поиска (None, если это не ответ API)"""
+        data = json.loads(content)
+        if not (isinstance(data, dict) and 'content' in data):
+            return None
+        return self._lots_from_api_data(data)
+    
+    def parse_listing_html(self, content: bytes) -> Optional[List[Dict]]:
+        """Лоты из сырого HTML страницы реестра: таблица, карточки или JSON в script"""
+        root = _parse_html(content)
+        if root is None:
+            return None
+        for extract in (self._lots_from_table, self._lots_from_cards, self._lots_from_script_json):
+            lots = extract(root)
+            if lots is not None:
                 return lots
-            
-            # 3. JSON данные в script тегах
-            scripts = soup.find_all('script', type='application/json')
-            for script in scripts:
-                try:
-                    data = json.loads(script.string)
-                    if isinstance(data, list):
-                        for item in data:
-                            lot_data = self.parse_lot_from_dict(item)
-                            if lot_data:
-                                lots.append(lot_data)
-                        return lots
-                except:
-                    continue
-            
-            # Fallback: если это SPA и данные подгружаются через JS, пробуем headless-браузер (Selenium)
-            print("Данные не найдены в HTML/API. Пробуем Selenium (headless)...")
-            try:
-                lots = self.get_lots_via_selenium(filters=filters, page=page)
-                if lots:
-                    return lots
-            except Exception as e:
-                print(f"Selenium fallback failed: {e}")
-            
+        return None
+    
+    def _archive(self, kind: str, url: str, content: bytes,
+                 filters: Optional[Dict] = None, page: Optional[int] = None):
+        """Сохранить сырой ответ в архив (ошибки архива не мешают обходу)"""
+        if self.archive is None:
+            return
+        try:
+            self.archive.store(kind, url, content, filters, page)
         except Exception as e:
-            print(f"Ошибка при получении лотов: {e}")
+            logger.warning(f"Не удалось сохранить ответ в архив: {e}")
+    
+    def _lots_from_table(self, root) -> Optional[List[Dict]]:
+        """Лоты из HTML таблицы"""
+        table = next(root.iter('table'), None)
+        if table is None:
+            return None
+        
+        lots = []
+        rows = list(table.iter('tr'))[1:]  # Пропускаем заголовок
+        for row in rows:
+            lot_data = self.parse_lot_from_row(row)
+            if lot_data:
+                lots.append(lot_data)
+        return lots
+    
+    def _lots_from_cards(self, root) -> Optional[List[Dict]]:
+        """Лоты из списка карточек/блоков"""
+        cards = [
+            el for el in root.iter(*_CARD_TAGS)
+            if _CARD_CLASS_RE.search(el.get('class', ''))
+        ]
+        if not cards:
+            return None
         
+        lots = []
+        for card in cards:
+            lot_data = self.parse_lot_from_card(card)
+            if lot_data:
+                lots.append(lot_data)
         return lots
     
-    def get_all_lots(self, filters: Dict, max_pages: int = 10) -> List[Dict]:
-        """Получить все лоты с учетом фильтров (несколько страниц)"""
-        all_lots = []
+    def _lots_from_script_json(self, root) -> Optional[List[Dict]]:
+        """Лоты из JSON данных в script тегах"""
+        for script in root.iter('script'):
+            if script.get('type') != 'application/json':
+                continue
+            try:
+                data = json.loads(script.text)
+            except Exception:
+                continue
+            if isinstance(data, list):
+                lots = []
+                for item in data:
+                    lot_data = self.parse_lot_from_dict(item)
+                    if lot_data:
+                        lots.append(lot_data)
+                return lots
+        return None
+    
+    def get_all_lots(self, filters: Dict, max_pages: int = 10,
+                     stop_when: Optional[Callable[[List[Dict]], bool]] = None,
+                     on_page: Optional[Callable[[int, Optional[int]], None]] = None,
+                     max_lots: Optional[int] = None) -> List[Dict]:
+        """Получить все лоты с учетом фильтров (несколько страниц)
+        
+        stop_when вызывается для каждой полученной страницы по порядку; если он
+        вернул True, обход прекращается (инкрементальный режим). Если первая
+        страница сообщила общее число страниц (API), остальные загружаются
+        параллельно пачками по config.PAGE_FETCH_WORKERS. on_page(номер страницы,
+        последняя страница обхода или None) вызывается после каждой страницы с лотами.
+        max_lots ограничивает обход числом лотов: размер страницы API подбирается
+        на ходу, поэтому предел в страницах означал бы разное число лотов.
+        """
+        print("Парсинг страницы 1...")
+        lots, total_pages = self._fetch_page(filters, 1)
+        if not lots:
+            return []
+        
+        if max_lots is not None:
+            # Размер страницы известен по первой: сколько страниц нужно на max_lots лотов
+            max_pages = min(max_pages, max(1, -(-max_lots // len(lots))))
+        last_page = min(total_pages, max_pages) if total_pages is not None else None
+        report_page = on_page or (lambda page, last_page: None)
+        report_page(1, last_page)
+        all_lots = list(lots)
+        if stop_when and stop_when(lots):
+            print("Страница 1 не содержит новых или изменённых лотов, обход остановлен")
+            return all_lots[:max_lots]
         
-        for page in range(1, max_pages + 1):
+        if total_pages is not None:
+            workers = max(1, config.PAGE_FETCH_WORKERS)
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for batch_start in range(2, last_page + 1, workers):
+                    pages = list(range(batch_start, min(batch_start + workers, last_page + 1)))
+                    print(f"Парсинг страниц {pages[0]}-{pages[-1]} из {total_pages}...")
+                    results = executor.map(lambda page: self.get_lots_from_page(filters, page), pages)
+                    
+                    for page, page_lots in zip(pages, results):
+                        if not page_lots:
+                            return all_lots[:max_lots]
+                        report_page(page, last_page)
+                        all_lots.extend(page_lots)
+                        if stop_when and stop_when(page_lots):
+                            print(f"Страница {page} не содержит новых или изменённых лотов, обход остановлен")
+                            return all_lots[:max_lots]
+            
+            return all_lots[:max_lots]
+        
+        # Источник не сообщает число страниц — идём последовательно до пустой страницы
+        for page in range(2, max_pages + 1):
             print(f"Парсинг страницы {page}...")
             lots = self.get_lots_from_page(filters, page)
             
             if not lots:
                 break
             
+            report_page(page, None)
             all_lots.extend(lots)
-            time.sleep(1)  # Небольшая задержка между запросами
+            
+            if stop_when and stop_when(lots):
+                print(f"Страница {page} не содержит новых или изменённых лотов, обход остановлен")
+                break
         
-        return all_lots
+        return all_lots[:max_lots]
     
-    def get_lot_details(self, lot_url: str) -> Dict:
-        """Получить детальную информацию о лоте"""
+    def get_lot_details(self, lot_url: str) -> Optional[Dict]:
+        """Получить детальную информацию о лоте (None, если страницу загрузить не удалось)"""
         try:
-            response = self.session.get(lot_url, timeout=30)
-            response.raise_for_status()
+            # Страница скачивается и разбирается заново только если изменилась
+            def archive_and_extract(content: bytes) -> Dict:
+                self._archive(KIND_DETAIL, lot_url, content)
+                return self.extract_lot_details(content)
             
-            soup = BeautifulSoup(response.content, 'lxml')
-            
-            details = {}
-            
-            # Ищем детальную информацию на странице лота
-            # Структура может быть разной, поэтому ищем по ключевым словам
+            return self.cache.fetch(self.session, lot_url, archive_and_extract, timeout=30)
+        except Exception as e:
+            print(f"Ошибка при получении деталей лота: {e}")
+            return None
+    
+    def extract_lot_details(self, content: bytes) -> Dict:
+        """Извлечь детальную информацию о лоте из HTML страницы"""
+        details = {}
+        root = _parse_html(content)
+        if root is None:
+            return details
+        
+        # Ищем детальную информацию на странице лота
+        # Структура может быть разной, поэтому ищем по ключевым словам
+        
+        # Ищем все элементы с данными
+        def is_info_block(el) -> bool:
+            return el.tag in _INFO_TAGS and bool(_INFO_CLASS_RE.search(el.get('class', '')))
+        
+        for _, text in _element_texts(root, is_info_block, include_root=True):
+            low = text.lower()
             
-            # Ищем все элементы с данными
-            info_blocks = soup.find_all(['div', 'span', 'p'], class_=re.compile(r'info|data|field|value'))
+            # Организатор
+            if 'организатор' in low and not details.get('organizer'):
+                details['organizer'] = text.replace('Организатор', '').strip()
             
-            for block in info_blocks:
-                text = block.get_text(strip=True)
-                
-                # Организатор
-                if 'организатор' in text.lower() and not details.get('organizer'):
-                    details['organizer'] = text.replace('Организатор', '').strip()
-                
-                # Адрес
-                if 'адрес' in text.lower() and not details.get('address'):
-                    details['address'] = text.replace('Адрес', '').strip()
-                
-                # Регион
-                if any(keyword in text.lower() for keyword in ['край', 'область', 'республика']) and not details.get('region'):
-                    details['region'] = text.strip()
+            # Адрес
+            if 'адрес' in low and not details.get('address'):
+                details['address'] = text.replace('Адрес', '').strip()
             
-            return details
+            # Регион
+            if not details.get('region') and _DETAIL_REGION_RE.search(low):
+                details['region'] = text.strip()
             
-        except Exception as e:
-            print(f"Ошибка при получении деталей лота: {e}")
-            return {}
+            if details.get('organizer') and details.get('address') and details.get('region'):
+                # Все поля найдены, остальные блоки не повлияют на результат
+                break
+        
+        return details
+    
+    def _host_limit(self, url: str, per_host: int) -> threading.BoundedSemaphore:
+        """Семафор, ограничивающий число одновременных запросов к хосту"""
+        host = urlparse(url).netloc
+        with self._host_limits_lock:
+            sem = self._host_limits.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(per_host)
+                self._host_limits[host] = sem
+            return sem
+    
+    def get_lots_details(self, lots: List[Dict], workers: Optional[int] = None,
+                         per_host: Optional[int] = None,
+                         on_done: Optional[Callable[[], None]] = None) -> List[Optional[Dict]]:
+        """Получить детали для списка лотов параллельно.
+        
+        Возвращает список словарей в том же порядке, что и входные лоты.
+        Для лотов без URL возвращается пустой словарь, при ошибке загрузки — None
+        (детали неизвестны, а не пусты).
+        on_done вызывается после обработки каждого лота (из рабочих потоков).
+        """
+        workers = workers or config.DETAIL_FETCH_WORKERS
+        per_host = per_host or config.DETAIL_FETCH_PER_HOST
+        
+        def fetch(lot: Dict) -> Optional[Dict]:
+            try:
+                lot_url = lot.get('lot_url')
+                if not lot_url:
+                    return {}
+                with self._host_limit(lot_url, per_host):
+                    return self.get_lot_details(lot_url)
+            finally:
+                if on_done:
+                    on_done()
+        
+        if not lots:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(workers, len(lots))) as executor:
+            # map сохраняет порядок входных данных
+            results = list(executor.map(fetch, lots))
+        
+        self.cache.evict()
+        return results
     
     def parse_lot_from_api(self, item: Dict) -> Optional[Dict]:
         """Парсинг лота из API ответа"""
@@ -302,7 +721,7 @@ class TorgiParser:
             return None
     
     def parse_lot_from_card(self, card) -> Optional[Dict]:
-        """Парсинг лота из карточки/блока"""
+        """Парсинг лота из карточки/блока (элемент lxml)"""
         try:
             lot_data = {
                 'lot_number': '',
@@ -320,22 +739,21 @@ class TorgiParser:
             }
             
             # Ищем ссылку
-            link = card.find('a', href=True)
-            if link:
-                lot_data['lot_url'] = urljoin(self.base_url, link['href'])
-                lot_data['title'] = link.get_text(strip=True)
+            link = _first_link(card)
+            if link is not None:
+                lot_data['lot_url'] = urljoin(self.base_url, link.get('href'))
+                lot_data['title'] = _link_text(link)
                 # Извлекаем номер из URL
-                lot_number_match = re.search(r'(\d+)', lot_data['lot_url'])
+                lot_number_match = _NUMBER_RE.search(lot_data['lot_url'])
                 if lot_number_match:
                     lot_data['lot_number'] = lot_number_match.group(1)
             
             # Ищем все текстовые элементы
-            text_elements = card.find_all(['span', 'div', 'p', 'td'])
-            for elem in text_elements:
-                text = elem.get_text(strip=True)
+            for _, text in _element_texts(card, lambda el: el.tag in _CARD_TEXT_TAGS):
+                low = text.lower()
                 
                 # Цены
-                if '₽' in text or 'руб' in text.lower():
+                if '₽' in text or 'руб' in low:
                     price = self.parse_price(text)
                     if price:
                         if not lot_data['initial_price']:
@@ -344,20 +762,18 @@ class TorgiParser:
                             lot_data['current_price'] = price
                 
                 # Регион
-                if any(keyword in text.lower() for keyword in ['край', 'область', 'республика', 'округ']):
-                    if not lot_data['region']:
-                        lot_data['region'] = text
+                if not lot_data['region'] and _REGION_RE.search(low):
+                    lot_data['region'] = text
                 
                 # Статус
-                status_keywords = ['прием', 'заявок', 'публикация', 'закрыт', 'отменен', 'проведен']
-                if any(keyword in text.lower() for keyword in status_keywords):
-                    if not lot_data['status']:
-                        lot_data['status'] = text
+                if not lot_data['status'] and _STATUS_RE.search(low):
+                    lot_data['status'] = text
                 
                 # Даты
-                date_match = re.search(r'\d{2}\.\d{2}\.\d{4}', text)
-                if date_match and not lot_data['application_deadline']:
-                    lot_data['application_deadline'] = date_match.group(0)
+                if not lot_data['application_deadline']:
+                    date_match = _DATE_RE.search(text)
+                    if date_match:
+                        lot_data['application_deadline'] = date_match.group(0)
             
             if lot_data['lot_number'] or lot_data['title']:
                 return lot_data
@@ -370,13 +786,10 @@ class TorgiParser:
     def parse_lot_from_dict(self, item: Dict) -> Optional[Dict]:
         """Парсинг лота из словаря (JSON данных)"""
         return self.parse_lot_from_api(item)
-
-
+    
     def get_lots_via_selenium(self, filters: Dict, page: int = 1, wait_seconds: int = 20) -> List[Dict]:
         """Получить лоты через headless Selenium (fallback для SPA)."""
         try:
-            from selenium import webdriver
-            from selenium.webdriver.chrome.options import Options
             from selenium.webdriver.common.by import By
             from selenium.webdriver.support.ui import WebDriverWait
         except Exception as e:
@@ -384,17 +797,15 @@ class TorgiParser:
                 "Selenium не установлен. Установите: pip install -r requirements.txt и пакеты chromium/chromedriver"
             ) from e
 
-        opts = Options()
-        opts.add_argument('--headless=new')
-        opts.add_argument('--no-sandbox')
-        opts.add_argument('--disable-dev-shm-usage')
-        opts.add_argument('--disable-gpu')
-        opts.add_argument('--window-size=1920,1080')
+        with self._host_limits_lock:
+            # Профили фильтров обходятся параллельно — пул создаётся один раз
+            if self.browser_pool is None:
+                self.browser_pool = BrowserPool()
 
-        driver = webdriver.Chrome(options=opts)
-        try:
-            # Для SPA: открываем страницу реестра лотов
-            url = self.base_url
+        # Браузер берётся из пула и остаётся запущенным для следующих страниц
+        with self.browser_pool.browser() as driver:
+            # Для SPA: открываем страницу реестра лотов с фильтрами и номером страницы
+            url = self.listing_url(filters, page)
             driver.get(url)
 
             # Ждём появления ссылок на лоты
@@ -469,5 +880,9 @@ class TorgiParser:
                 lots.append(lot_data)
 
             return lots
-        finally:
-            driver.quit()
+    
+    def close(self):
+        """Освободить ресурсы парсера (браузеры Selenium)"""
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+            self.browser_pool = None
@@ -0,0 +1,243 @@
+# Модуль ограничения частоты запросов к torgi.gov.ru и защиты от недоступности сайта
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+import config
+
+logger = logging.getLogger(__name__)
+
+# Коды ответа, после которых имеет смысл повторить запрос
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Повторяются только идемпотентные запросы
+RETRY_METHODS = frozenset({'GET', 'HEAD'})
+# Ошибки, которые говорят о сбое на стороне сайта, хотя соединение установилось
+SITE_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+    requests.exceptions.TooManyRedirects,
+)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Сайт признан недоступным, запрос не отправлялся"""
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах (число секунд или HTTP-дата)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+class AdaptiveRateLimiter:
+    """Token bucket, скорость которого подстраивается под состояние сайта.
+
+    Быстрые успешные ответы понемногу повышают скорость (аддитивно), медленные
+    ответы, ошибки и 429 снижают её (мультипликативно). Retry-After
+    приостанавливает выдачу токенов до указанного момента.
+    """
+
+    def __init__(self, rate: float = config.RATE_LIMIT_INITIAL_RPS,
+                 min_rate: float = config.RATE_LIMIT_MIN_RPS,
+                 max_rate: float = config.RATE_LIMIT_MAX_RPS,
+                 burst: int = config.RATE_LIMIT_BURST,
+                 target_latency: float = config.RATE_LIMIT_TARGET_LATENCY):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.target_latency = target_latency
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Дождаться разрешения на отправку одного запроса"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self, latency: float):
+        with self._lock:
+            if latency > self.target_latency:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+            else:
+                self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_error(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+
+    def on_throttle(self, retry_after: Optional[float]):
+        """Сайт попросил снизить нагрузку (429/503)"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self._tokens = 0.0
+
+class CircuitBreaker:
+    """Размыкатель: после серии ошибок подряд запросы сразу отклоняются.
+
+    Через reset_seconds пропускается один пробный запрос: если он успешен
+    (или сайт ответил 429 — он жив и лишь просит притормозить), размыкатель
+    замыкается, иначе снова открывается. Пробный запрос разрешается при любом
+    исходе, в том числе при неожиданном исключении.
+    """
+
+    def __init__(self, failure_threshold: int = config.CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = config.CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._trial_thread: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            # Полуоткрытое состояние: пропускаем один пробный запрос
+            self._trial_in_flight = True
+            self._trial_thread = threading.get_ident()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Сайт снова отвечает, размыкатель закрыт")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(
+                    f"Сайт недоступен ({self._failures} ошибок подряд), "
+                    f"запросы приостановлены на {self.reset_seconds:.0f} с"
+                )
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_throttled(self):
+        """Сайт ответил 429: ошибкой не считается, пробный запрос замыкает размыкатель"""
+        with self._lock:
+            if not self._trial_in_flight:
+                return
+            logger.info("Сайт снова отвечает (просит снизить частоту), размыкатель закрыт")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Пробный запрос этого потока завершился без результата — размыкатель снова открыт"""
+        with self._lock:
+            if not self._trial_in_flight or self._trial_thread != threading.get_ident():
+                return
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+# Общие для всех сессий процесса: веб-приложение и планировщик ходят на один сайт
+shared_limiter = AdaptiveRateLimiter()
+shared_breaker = CircuitBreaker()
+
+class ThrottledSession(requests.Session):
+    """requests.Session с ограничением частоты, повторами и размыкателем"""
+
+    def __init__(self, limiter: Optional[AdaptiveRateLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 max_retries: int = config.HTTP_MAX_RETRIES):
+        super().__init__()
+        self.limiter = limiter or shared_limiter
+        self.breaker = breaker or shared_breaker
+        self.max_retries = max_retries
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным джиттером"""
+        cap = min(config.HTTP_BACKOFF_MAX, config.HTTP_BACKOFF_BASE * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def request(self, method, url, *args, **kwargs):
+        retries = self.max_retries if method.upper() in RETRY_METHODS else 0
+
+        for attempt in range(retries + 1):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(f"Сайт временно недоступен, запрос к {url} не отправлен")
+
+            try:
+                self.limiter.acquire()
+                started = time.monotonic()
+                try:
+                    response = super().request(method, url, *args, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    self.breaker.record_failure()
+                    self.limiter.on_error()
+                    if attempt >= retries:
+                        raise
+                    time.sleep(self._backoff(attempt))
+                    continue
+                except SITE_ERRORS:
+                    # Оборванное тело ответа, цикл редиректов и т. п. — тоже сбой сайта
+                    self.breaker.record_failure()
+                    self.limiter.on_error()
+                    raise
+                latency = time.monotonic() - started
+
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    self.limiter.on_success(latency)
+                    return response
+
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if response.status_code in (429, 503):
+                    self.limiter.on_throttle(retry_after)
+                else:
+                    self.limiter.on_error()
+                if response.status_code == 429:
+                    # 429 — сайт жив, просто просит притормозить
+                    self.breaker.record_throttled()
+                else:
+                    self.breaker.record_failure()
+
+                if attempt >= retries:
+                    return response
+                delay = self._backoff(attempt)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if delay > config.HTTP_BACKOFF_MAX:
+                    # Ждать дольше разумного в рамках одной проверки не будем
+                    return response
+                time.sleep(delay)
+            finally:
+                # Пробный запрос не должен остаться неразрешённым при любом исходе
+                self.breaker.release_trial()
@@ -6,10 +6,366 @@ import parser
 import telegram_bot
 import config
 import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class CheckProgress:
+    """Ход проверки: этап, загруженные страницы, обработанные лоты и оценка времени.
+
+    Обновляется из рабочих потоков обхода и загрузки деталей, читается
+    веб-интерфейсом через snapshot(). Оставшееся время считается по скорости
+    текущего этапа, а пока её не из чего оценить — по длительности прошлой
+    проверки (expected_seconds).
+    """
+    
+    def __init__(self, expected_seconds: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.expected_seconds = expected_seconds
+        self.stage = 'crawl'
+        self.stage_started = self.started
+        self.finished: Optional[float] = None
+        self.pages_fetched = 0
+        self.last_pages: Dict[str, Optional[int]] = {}  # профиль -> последняя страница обхода
+        self.lots_found = 0
+        self.lots_total = 0
+        self.lots_processed = 0
+    
+    def set_stage(self, stage: str, lots_total: Optional[int] = None):
+        """Перейти к этапу: crawl, details, save, notify, done"""
+        with self._lock:
+            self.stage = stage
+            self.stage_started = time.monotonic()
+            if stage == 'done':
+                self.finished = self.stage_started
+            if lots_total is not None:
+                self.lots_found = self.lots_total = lots_total
+    
+    def page_fetched(self, profile: str, page: int, last_page: Optional[int]):
+        """Загружена страница списка лотов профиля"""
+        with self._lock:
+            self.pages_fetched += 1
+            self.last_pages[profile] = last_page
+    
+    def lot_processed(self):
+        """Загружены детали одного лота"""
+        with self._lock:
+            self.lots_processed += 1
+    
+    def snapshot(self) -> Dict:
+        """Текущее состояние для /api/check/<id>"""
+        with self._lock:
+            now = self.finished or time.monotonic()
+            elapsed = now - self.started
+            # Число страниц известно, только если его сообщили все профили (API)
+            pages_expected = None
+            if self.last_pages and None not in self.last_pages.values():
+                pages_expected = sum(self.last_pages.values())
+            
+            done, total = None, None
+            if self.stage == 'crawl':
+                done, total = self.pages_fetched, pages_expected
+            elif self.stage == 'details':
+                done, total = self.lots_processed, self.lots_total
+            
+            eta = None
+            if self.stage == 'done':
+                eta = 0
+            elif done and total:
+                eta = (now - self.stage_started) / done * max(total - done, 0)
+            elif self.expected_seconds is not None:
+                eta = max(self.expected_seconds - elapsed, 0)
+            
+            return {
+                'stage': self.stage,
+                'pages_fetched': self.pages_fetched,
+                'pages_expected': pages_expected,
+                'lots_found': self.lots_found,
+                'lots_processed': self.lots_processed,
+                'lots_total': self.lots_total,
+                'elapsed_seconds': round(elapsed, 1),
+                'eta_seconds': None if eta is None else round(eta, 1),
+            }
+
+def crawl_lots(db: database.Database, torgi_parser: parser.TorgiParser, filters: Dict,
+               on_page: Optional[Callable[[int, Optional[int]], None]] = None) -> Tuple[List[Dict], bool]:
+    """Получить лоты с сайта: полный обход при первом запуске, дальше — инкрементальный.
+    
+    Возвращает лоты и признак первого обхода набора фильтров (отметки ещё не было).
+    """
+    filter_key = parser.filters_key(filters)
+    high_water_mark = db.get_high_water_mark(filter_key)
+    
+    def page_is_known(page_lots: List[Dict]) -> bool:
+        # Страница "известна", если все её лоты уже есть в БД с теми же данными
+        known = db.get_listing_fingerprints([lot.get('lot_number', '') for lot in page_lots])
+        return all(
+            known.get(lot.get('lot_number', '')) == database.listing_fingerprint(lot)
+            for lot in page_lots
+        )
+    
+    if high_water_mark is None or config.CRAWL_MODE == 'full':
+        logger.info("Полный обход реестра")
+        lots = torgi_parser.get_all_lots(filters, max_pages=config.CRAWL_MAX_PAGES, on_page=on_page,
+                                         max_lots=config.CRAWL_BACKFILL_LOTS)
+    else:
+        lots = torgi_parser.get_all_lots(filters, max_pages=config.CRAWL_MAX_PAGES, stop_when=page_is_known,
+                                         on_page=on_page, max_lots=config.CRAWL_MAX_LOTS)
+        numbers = [lot.get('lot_number') for lot in lots]
+        if high_water_mark in numbers:
+            logger.info(f"Лотов новее отметки {high_water_mark}: {numbers.index(high_water_mark)}")
+    
+    if lots and lots[0].get('lot_number'):
+        db.save_high_water_mark(filter_key, lots[0]['lot_number'])
+    
+    return lots, high_water_mark is None
+
+def run_check(db: database.Database, torgi_parser: parser.TorgiParser,
+              telegram: telegram_bot.TelegramBot, progress: Optional[CheckProgress] = None) -> Dict:
+    """Полная проверка по всем профилям фильтров.
+    
+    Профили обходятся параллельно. Лот, найденный несколькими профилями,
+    загружается, сохраняется и отправляется в Telegram один раз.
+    Возвращает сводку с разбивкой по профилям; ход проверки пишется в progress.
+    """
+    progress = progress or CheckProgress()
+    summary = {
+        'total_found': 0,
+        'new_lots': 0,
+        'updated_lots': 0,      # сменился статус
+        'changed_lots': 0,      # изменилось любое поле (записано в БД)
+        'unchanged_lots': 0,    # данные не изменились, запись пропущена
+        'changed_fields': {},   # поле -> сколько лотов с изменением этого поля
+        'profiles': {},
+    }
+    
+    profiles = db.get_filter_profiles()
+    # Профиль без фильтров означал бы обход всего реестра — такие профили пропускаем
+    for name in [name for name, filters in profiles.items() if not filters]:
+        logger.warning(f"Фильтры профиля {name} не настроены, профиль пропущен")
+        del profiles[name]
+    if not profiles:
+        logger.warning("Фильтры не настроены, пропуск проверки")
+        return summary
+    
+    torgi_parser.cache.reset_stats()
+    
+    # Обходим профили параллельно
+    workers = min(config.PROFILE_CRAWL_WORKERS, len(profiles))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            name: executor.submit(
+                crawl_lots, db, torgi_parser, filters,
+                lambda page, last_page, name=name: progress.page_fetched(name, page, last_page)
+            )
+            for name, filters in profiles.items()
+        }
+    
+    # Объединяем результаты, убирая дубли по номеру лота
+    unique_lots: Dict[str, Dict] = {}
+    lot_profiles: Dict[str, List[str]] = {}
+    backfill_profiles = set()  # профили, чьи фильтры обходятся впервые
+    for name, future in futures.items():
+        profile_summary = {'found': 0, 'shared': 0, 'new': 0, 'updated': 0, 'changed': 0, 'unchanged': 0}
+        summary['profiles'][name] = profile_summary
+        try:
+            profile_lots, is_backfill = future.result()
+        except Exception as e:
+            logger.error(f"Ошибка при обходе профиля {name}: {e}")
+            profile_summary['error'] = str(e)
+            continue
+        
+        profile_summary['found'] = len(profile_lots)
+        if is_backfill:
+            backfill_profiles.add(name)
+        logger.info(f"Профиль {name}: найдено {len(profile_lots)} лотов на сайте")
+        for lot in profile_lots:
+            lot_number = lot.get('lot_number', '')
+            if lot_number in unique_lots:
+                profile_summary['shared'] += 1
+                if name not in lot_profiles[lot_number]:
+                    lot_profiles[lot_number].append(name)
+                continue
+            unique_lots[lot_number] = lot
+            lot_profiles[lot_number] = [name]
+    
+    lots = list(unique_lots.values())
+    summary['total_found'] = len(lots)
+    logger.info(f"Уникальных лотов по всем профилям: {len(lots)}")
+    
+    # Получаем детали лотов параллельно (порядок сохраняется)
+    progress.set_stage('details', lots_total=len(lots))
+    details_list = torgi_parser.get_lots_details(lots, on_done=progress.lot_processed)
+    
+    # Лоты, чьи страницы не загрузились: их детали в базе остаются прежними
+    details_missing = []
+    for lot, details in zip(lots, details_list):
+        if details is None:
+            details_missing.append(lot['lot_number'])
+            continue
+        lot.update(details)
+    if details_missing:
+        logger.warning(f"Не удалось загрузить детали {len(details_missing)} лотов, сохраняются прежние")
+    
+    # Сохраняем все лоты одной транзакцией
+    progress.set_stage('save')
+    saved = db.save_lots(lots, details_missing=details_missing)
+    progress.set_stage('notify')
+    
+    # Лоты первого обхода набора фильтров «новые» только для базы: о них одна сводка, а не сотни сообщений
+    backfill_new: Dict[str, int] = {}
+    for lot in saved['new']:
+        summary['new_lots'] += 1
+        names = lot_profiles[lot['lot_number']]
+        for name in names:
+            summary['profiles'][name]['new'] += 1
+        if all(name in backfill_profiles for name in names):
+            backfill_new[names[0]] = backfill_new.get(names[0], 0) + 1
+            continue
+        logger.info(f"Новый лот: {lot.get('title', 'Без названия')}")
+        telegram.notify_new_lot(lot)
+    if backfill_new:
+        logger.info(f"Первый обход фильтров, лотов без отдельных уведомлений: {backfill_new}")
+        telegram.notify_backfill(backfill_new)
+    
+    for lot, old_status, changed_fields in saved['changed']:
+        lot_number = lot['lot_number']
+        summary['changed_lots'] += 1
+        for field in changed_fields:
+            summary['changed_fields'][field] = summary['changed_fields'].get(field, 0) + 1
+        for name in lot_profiles[lot_number]:
+            summary['profiles'][name]['changed'] += 1
+        
+        if 'status' not in changed_fields:
+            continue
+        summary['updated_lots'] += 1
+        for name in lot_profiles[lot_number]:
+            summary['profiles'][name]['updated'] += 1
+        logger.info(f"Изменение статуса лота {lot_number}: {old_status} -> {lot.get('status', '')}")
+        telegram.notify_status_change(lot, old_status)
+    
+    summary['unchanged_lots'] = len(saved['unchanged'])
+    for lot, _ in saved['unchanged']:
+        for name in lot_profiles[lot['lot_number']]:
+            summary['profiles'][name]['unchanged'] += 1
+    
+    summary['cache'] = torgi_parser.cache.stats()
+    return summary
+
+class CheckJob:
+    """Одна проверка: кто её запустил, состояние, ход и итоговая сводка"""
+    
+    def __init__(self, source: str, expected_seconds: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.source = source  # 'manual' или 'scheduler'
+        self.status = 'running'  # running, done, error
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.attached = 0  # сколько запросов присоединилось к уже идущей проверке
+        self.progress = CheckProgress(expected_seconds)
+        self.summary: Optional[Dict] = None
+        self.error: Optional[str] = None
+    
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'source': self.source,
+            'status': self.status,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': self.finished_at.isoformat(timespec='seconds') if self.finished_at else None,
+            'attached': self.attached,
+            'progress': self.progress.snapshot(),
+            'summary': self.summary,
+            'error': self.error,
+        }
+
+class CheckRunner:
+    """Проверки по одной за раз (single-flight).
+    
+    Плановая и ручная проверка обходят одни и те же страницы, поэтому
+    одновременно выполняется не больше одной: запрос, пришедший во время
+    проверки, присоединяется к ней и получает её id. Последние keep проверок
+    хранятся в памяти, чтобы их ход и итог можно было запросить по id.
+    """
+    
+    def __init__(self, keep: int = config.CHECK_JOBS_KEEP):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, CheckJob]' = OrderedDict()
+        self._current: Optional[CheckJob] = None
+        self._last_duration: Optional[float] = None
+    
+    def _claim(self, source: str) -> Tuple[CheckJob, bool]:
+        """Идущая проверка (False) или новая, если ничего не выполняется (True)"""
+        with self._lock:
+            if self._current is not None:
+                self._current.attached += 1
+                return self._current, False
+            job = CheckJob(source, self._last_duration)
+            self._current = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > max(self.keep, 1):
+                self._jobs.popitem(last=False)
+            return job, True
+    
+    def _execute(self, job: CheckJob, db: database.Database, torgi_parser: parser.TorgiParser,
+                 telegram: telegram_bot.TelegramBot):
+        try:
+            job.summary = run_check(db, torgi_parser, telegram, job.progress)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'error'
+            logger.error(f"Ошибка при проверке аукционов: {e}")
+        finally:
+            job.progress.set_stage('done')
+            job.finished_at = datetime.now()
+            with self._lock:
+                if job.status == 'done':
+                    self._last_duration = (job.finished_at - job.started_at).total_seconds()
+                self._current = None
+    
+    def submit(self, db: database.Database, torgi_parser: parser.TorgiParser,
+               telegram: telegram_bot.TelegramBot, source: str = 'manual') -> Tuple[CheckJob, bool]:
+        """Запустить проверку в фоновом потоке; вернуть её и признак, что она новая"""
+        job, started = self._claim(source)
+        if started:
+            threading.Thread(
+                target=self._execute, args=(job, db, torgi_parser, telegram),
+                name=f'check-{job.id[:8]}', daemon=True
+            ).start()
+        return job, started
+    
+    def run(self, db: database.Database, torgi_parser: parser.TorgiParser,
+            telegram: telegram_bot.TelegramBot, source: str = 'scheduler') -> Tuple[CheckJob, bool]:
+        """Выполнить проверку в текущем потоке; если уже идёт другая — не запускать вторую"""
+        job, started = self._claim(source)
+        if started:
+            self._execute(job, db, torgi_parser, telegram)
+        return job, started
+    
+    def get(self, job_id: str) -> Optional[CheckJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def latest(self) -> Optional[CheckJob]:
+        """Идущая проверка, а если её нет — последняя завершённая"""
+        with self._lock:
+            if self._current is not None:
+                return self._current
+            return next(reversed(self._jobs.values()), None)
+
+# Общий для веб-приложения и планировщика (они работают в одном процессе, см. main.py)
+checks = CheckRunner()
+
 class AuctionScheduler:
     def __init__(self):
         self.scheduler = BackgroundScheduler()
@@ -22,54 +378,32 @@ class AuctionScheduler:
         """Проверка новых аукционов и изменений статусов"""
         logger.info("Начало проверки аукционов...")
         
-        try:
-            # Получаем сохраненные фильтры
-            filters = self.db.get_filters() or {}
-            
-            if not filters:
-                logger.warning("Фильтры не настроены, пропуск проверки")
-                return
-            
-            # Получаем лоты с сайта
-            lots = self.torgi_parser.get_all_lots(filters, max_pages=5)
-            logger.info(f"Найдено {len(lots)} лотов на сайте")
-            
-            new_count = 0
-            updated_count = 0
-            
-            for lot in lots:
-                # Получаем детали лота, если есть URL
-                if lot.get('lot_url'):
-                    try:
-                        details = self.torgi_parser.get_lot_details(lot['lot_url'])
-                        lot.update(details)
-                    except Exception as e:
-                        logger.warning(f"Не удалось получить детали лота {lot.get('lot_number')}: {e}")
-                
-                # Проверяем, существует ли лот в БД
-                existing_lot = self.db.get_lot(lot.get('lot_number', ''))
-                
-                # Сохраняем лот
-                is_new = self.db.save_lot(lot)
-                
-                if is_new:
-                    new_count += 1
-                    logger.info(f"Новый лот: {lot.get('title', 'Без названия')}")
-                    self.telegram.notify_new_lot(lot)
-                elif existing_lot:
-                    # Проверяем изменение статуса
-                    old_status = existing_lot.get('status', '')
-                    new_status = lot.get('status', '')
-                    
-                    if old_status != new_status:
-                        updated_count += 1
-                        logger.info(f"Изменение статуса лота {lot.get('lot_number')}: {old_status} -> {new_status}")
-                        self.telegram.notify_status_change(lot, old_status)
-            
-            logger.info(f"Проверка завершена. Новых: {new_count}, Обновлено: {updated_count}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при проверке аукционов: {e}")
+        job, started = checks.run(self.db, self.torgi_parser, self.telegram, source='scheduler')
+        if not started:
+            logger.info(f"Проверка {job.id} уже выполняется, плановый запуск присоединён к ней")
+            return
+        if job.status != 'done':
+            return
+        summary = job.summary
+        
+        for name, profile in summary['profiles'].items():
+            logger.info(
+                f"Профиль {name}: найдено {profile['found']} (из них в других профилях {profile['shared']}), "
+                f"новых {profile['new']}, обновлено {profile['updated']}, "
+                f"изменено {profile['changed']}, без изменений {profile['unchanged']}"
+            )
+        logger.info(
+            f"Проверка завершена. Новых: {summary['new_lots']}, Обновлено: {summary['updated_lots']}, "
+            f"изменено: {summary['changed_lots']} {summary['changed_fields']}, "
+            f"без изменений (запись пропущена): {summary['unchanged_lots']}"
+        )
+        
+        cache_stats = summary.get('cache')
+        if cache_stats:
+            logger.info(
+                f"Кэш страниц лотов: попаданий {cache_stats['hits']} из {cache_stats['requests']}, "
+                f"сэкономлено {cache_stats['bytes_saved']} байт и {cache_stats['parses_skipped']} разборов"
+            )
     
     def start(self):
         """Запустить планировщик"""
@@ -86,6 +420,34 @@ class AuctionScheduler:
             replace_existing=True
         )
         
+        # Раз в сутки чистим архив сырых ответов по сроку хранения
+        if self.torgi_parser.archive is not None:
+            self.scheduler.add_job(
+                func=self.torgi_parser.archive.apply_retention,
+                trigger=IntervalTrigger(hours=24),
+                id='archive_retention',
+                name='Очистка архива ответов',
+                replace_existing=True
+            )
+        
+        # Раз в сутки переносим давно завершённые лоты в архивную базу
+        self.scheduler.add_job(
+            func=self.db.archive_finished_lots,
+            trigger=IntervalTrigger(hours=24),
+            id='archive_finished_lots',
+            name='Перенос завершённых лотов в архив',
+            replace_existing=True
+        )
+        
+        # Раз в сутки сверяем сводную статистику с таблицами (страховка от расхождений)
+        self.scheduler.add_job(
+            func=self.db.reconcile_stats,
+            trigger=IntervalTrigger(hours=24),
+            id='reconcile_stats',
+            name='Пересчёт сводной статистики',
+            replace_existing=True
+        )
+        
         # Запускаем проверку сразу при старте
         self.check_auctions()
         
@@ -97,5 +459,6 @@ class AuctionScheduler:
         """Остановить планировщик"""
         if self.scheduler.running:
             self.scheduler.shutdown()
+            self.torgi_parser.close()
             self.is_running = False
             logger.info("Планировщик остановлен")
@@ -1,4 +1,5 @@
 # Модуль для работы с Telegram ботом
+import html
 import requests
 from typing import Dict, Optional
 import config
@@ -79,3 +80,14 @@ class TelegramBot:
         """Уведомить об изменении статуса"""
         message = self.format_lot_message(lot_data, is_new=False, old_status=old_status)
         return self.send_message(message)
+    
+    def notify_backfill(self, new_by_profile: Dict[str, int]) -> bool:
+        """Одна сводка о лотах, найденных первым обходом новых фильтров (без сообщения на каждый лот)"""
+        lines = [f"«{html.escape(name)}»: {count}" for name, count in new_by_profile.items()]
+        message = (
+            "📥 <b>Первый обход фильтров</b>\n"
+            f"Добавлено лотов в базу: {sum(new_by_profile.values())}\n"
+            + "\n".join(lines)
+            + "\n\nОб этих лотах отдельные уведомления не отправляются, новые будут приходить как обычно."
+        )
+        return self.send_message(message)